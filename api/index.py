@@ -3,33 +3,37 @@ import time
 import os
 import sys
 import json
-import queue
-import uuid
+import hashlib
 import threading
-from threading import Thread
+from collections import deque
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Import Flask
-from flask import Flask, request, jsonify
+# Import Flask and orjson for fast JSON serialization
+import orjson
+from flask import Flask, request
 
-# Minimal classes without dataclass decorators
+# Minimal classes without dataclass decorators; __slots__ avoids a per-instance dict
 class PipelineStep:
-    def __init__(self, step_name, start_time, end_time=None, status="running", details="", model_used=None):
+    __slots__ = ('step_name', 'start_ns', 'end_ns', 'status', 'details', 'model_used')
+
+    # Step timing uses integer monotonic nanoseconds so durations are immune to wall-clock jumps
+    def __init__(self, step_name, start_ns, end_ns=None, status="running", details="", model_used=None):
         self.step_name = step_name
-        self.start_time = start_time
-        self.end_time = end_time
+        self.start_ns = start_ns
+        self.end_ns = end_ns
         self.status = status
         self.details = details
         self.model_used = model_used
 
     def duration_ms(self):
-        if self.end_time:
-            return (self.end_time - self.start_time) * 1000
-        return (time.time() - self.start_time) * 1000
+        end_ns = self.end_ns if self.end_ns is not None else time.monotonic_ns()
+        return (end_ns - self.start_ns) / 1_000_000
 
 class PipelineProgress:
+    __slots__ = ('scenario_id', 'customer_input', 'steps', 'current_step', 'total_steps', 'start_time', 'end_time')
+
     def __init__(self, scenario_id, customer_input):
         self.scenario_id = scenario_id
         self.customer_input = customer_input
@@ -42,7 +46,7 @@ class PipelineProgress:
     def add_step(self, step_name, details="", model_used=None):
         step = PipelineStep(
             step_name=step_name,
-            start_time=time.time(),
+            start_ns=time.monotonic_ns(),
             details=details,
             model_used=model_used
         )
@@ -53,7 +57,7 @@ class PipelineProgress:
     def complete_current_step(self, details="", status="completed"):
         if self.steps:
             current = self.steps[-1]
-            current.end_time = time.time()
+            current.end_ns = time.monotonic_ns()
             current.status = status
             if details:
                 current.details = details
@@ -61,8 +65,8 @@ class PipelineProgress:
 # Global state management
 class AppState:
     def __init__(self):
-        self.review_queue = queue.Queue()
-        self.result_queue = queue.Queue()
+        self.review_queue = deque()
+        self.result_queue = deque()
         self.active_reviews = {}
         self.review_lock = threading.Lock()
         self.pipeline_progress = {}
@@ -72,25 +76,44 @@ class AppState:
         self.demo_results = []
         self.current_scenario_result = None
         self.current_scenario_id = None
-        self.demo_scenarios = [
+        self.current_progress = None  # PipelineProgress of current_scenario_id, read lock-free by polls
+        self.pending_scenario = None  # (scenario_id, scenario, ready_at)
+        self.demo_scenarios = (
             "My order was supposed to arrive yesterday but I haven't received anything. Can you check the status?",
             "This is the third time I'm contacting you about my damaged dining table. When will this be resolved?",
             "This is absolutely ridiculous! Your delivery team are complete idiots who damaged my wall and now you're ignoring me. Fix this NOW or I'm never shopping here again!"
+        )
+        # The scenario list is static, so /api/get_current_scenario bodies are serialized once
+        total = len(self.demo_scenarios)
+        self.scenario_bodies = [
+            orjson.dumps({
+                'status': 'success',
+                'scenario': scenario,
+                'scenario_number': i + 1,
+                'total_scenarios': total,
+                'can_process': True
+            })
+            for i, scenario in enumerate(self.demo_scenarios)
+        ]
+        self.scenario_etags = [
+            '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest() for body in self.scenario_bodies
         ]
 
 # Initialize Flask app
 app = Flask(__name__)
 app_state = AppState()
 
-@app.route('/')
-def index():
-    """Main demo interface"""
-    try:
-        template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'public', 'index.html')
-        with open(template_path, 'r', encoding='utf-8') as f:
-            return f.read()
-    except:
-        return """
+# Simulated processing time for the minimal demo
+SIMULATED_PROCESSING_S = 0.5
+
+# Simulated steps reported by /api/get_pipeline_progress, serialized once
+SIMULATED_STEPS_JSON = orjson.dumps([
+    {'step_name': 'safety_check', 'status': 'completed', 'details': 'Safety check passed', 'duration_ms': 50.0},
+    {'step_name': 'response_generation', 'status': 'completed', 'details': 'Response generated', 'duration_ms': 100.0}
+])
+
+# Served by / when public/index.html is unavailable
+FALLBACK_HTML = """
         <!DOCTYPE html>
         <html><head><title>Groq Demo</title></head>
         <body>
@@ -109,12 +132,32 @@ def index():
                 .catch(e => console.error('Demo start failed:', e));
             </script>
         </body></html>
-        """
+"""
+
+def load_index_html():
+    """Read public/index.html once, falling back to the minimal page"""
+    template_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'public', 'index.html')
+    try:
+        with open(template_path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return FALLBACK_HTML.encode('utf-8')
+
+INDEX_HTML = load_index_html()
+
+def json_response(payload, status=200):
+    """Serialize payload with orjson instead of flask.jsonify"""
+    return app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+
+@app.route('/')
+def index():
+    """Main demo interface"""
+    return app.response_class(INDEX_HTML, mimetype='text/html')
 
 @app.route('/api/health')
 def health():
     """Health check endpoint"""
-    return jsonify({
+    return json_response({
         'status': 'healthy',
         'environment': 'vercel-minimal',
         'python_version': sys.version,
@@ -129,8 +172,9 @@ def start_interactive_demo():
     app_state.current_scenario_index = 0
     app_state.demo_results = []
     app_state.pipeline_progress = {}
+    app_state.current_progress = None
 
-    return jsonify({
+    return json_response({
         'status': 'success',
         'total_scenarios': len(app_state.demo_scenarios),
         'current_scenario': 1
@@ -140,25 +184,24 @@ def start_interactive_demo():
 def get_current_scenario():
     """Get current scenario for interactive demo"""
     if app_state.demo_state != "running" or app_state.current_scenario_index >= len(app_state.demo_scenarios):
-        return jsonify({'status': 'no_scenario'})
+        return json_response({'status': 'no_scenario'})
 
-    scenario = app_state.demo_scenarios[app_state.current_scenario_index]
-    return jsonify({
-        'status': 'success',
-        'scenario': scenario,
-        'scenario_number': app_state.current_scenario_index + 1,
-        'total_scenarios': len(app_state.demo_scenarios),
-        'can_process': True
-    })
+    # Bodies never change per index; polling clients revalidate against the ETag
+    index = app_state.current_scenario_index
+    etag = app_state.scenario_etags[index]
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if request.headers.get('If-None-Match') == etag:
+        return app.response_class(status=304, headers=headers)
+    return app.response_class(app_state.scenario_bodies[index], mimetype='application/json', headers=headers)
 
 @app.route('/api/process_current_scenario', methods=['POST'])
 def process_current_scenario():
     """Process current scenario"""
     if app_state.demo_state != "running":
-        return jsonify({'status': 'error', 'message': 'Demo not running'})
+        return json_response({'status': 'error', 'message': 'Demo not running'})
 
     if app_state.current_scenario_index >= len(app_state.demo_scenarios):
-        return jsonify({'status': 'error', 'message': 'No scenario available'})
+        return json_response({'status': 'error', 'message': 'No scenario available'})
 
     scenario = app_state.demo_scenarios[app_state.current_scenario_index]
     scenario_id = f"demo_{app_state.current_scenario_index + 1}_{int(time.time())}"
@@ -168,10 +211,26 @@ def process_current_scenario():
     with app_state.progress_lock:
         progress = PipelineProgress(scenario_id, scenario)
         app_state.pipeline_progress[scenario_id] = progress
+    app_state.current_progress = progress
+
+    # Processing is simulated with a deadline rather than a sleeping thread;
+    # the polling endpoints finish the scenario once the deadline has passed
+    app_state.pending_scenario = (scenario_id, scenario, time.time() + SIMULATED_PROCESSING_S)
+
+    return json_response({'status': 'processing', 'scenario_id': scenario_id})
 
-    # Simulate processing in background
-    def simulate_processing():
-        time.sleep(0.5)  # Simulate processing time
+def finish_pending_scenario():
+    """Complete the simulated scenario once its processing deadline has passed"""
+    pending = app_state.pending_scenario
+    if pending is None or time.time() < pending[2]:
+        return
+
+    with app_state.progress_lock:
+        if app_state.pending_scenario is not pending:
+            return
+        app_state.pending_scenario = None
+
+        scenario_id, scenario, _ = pending
 
         # Create mock result
         result = {
@@ -189,58 +248,43 @@ def process_current_scenario():
         app_state.current_scenario_result = result
 
         # Mark progress complete
-        with app_state.progress_lock:
-            if scenario_id in app_state.pipeline_progress:
-                app_state.pipeline_progress[scenario_id].end_time = time.time()
-
-    thread = Thread(target=simulate_processing, daemon=True)
-    thread.start()
-
-    return jsonify({'status': 'processing', 'scenario_id': scenario_id})
+        if scenario_id in app_state.pipeline_progress:
+            app_state.pipeline_progress[scenario_id].end_time = time.time()
 
 @app.route('/api/get_pipeline_progress')
 def get_pipeline_progress():
     """Get pipeline progress"""
-    if not app_state.current_scenario_id:
-        return jsonify({'status': 'no_progress'})
-
-    with app_state.progress_lock:
-        progress = app_state.pipeline_progress.get(app_state.current_scenario_id)
-        if not progress:
-            return jsonify({'status': 'no_progress'})
-
-        # Simulate some steps
-        steps_data = [
-            {'step_name': 'safety_check', 'status': 'completed', 'details': 'Safety check passed', 'duration_ms': 50.0},
-            {'step_name': 'response_generation', 'status': 'completed', 'details': 'Response generated', 'duration_ms': 100.0}
-        ]
-
-        return jsonify({
-            'status': 'success',
-            'scenario_id': progress.scenario_id,
-            'customer_input': progress.customer_input,
-            'current_step': 2,
-            'total_steps': 6,
-            'steps': steps_data,
-            'total_duration_ms': 200.0,
-            'completed': progress.end_time is not None
-        })
+    finish_pending_scenario()
+    progress = app_state.current_progress
+    if not progress:
+        return json_response({'status': 'no_progress'})
+
+    # Only the scenario fields vary per poll; the simulated steps are spliced in pre-serialized
+    body = b''.join((
+        b'{"status":"success","scenario_id":', orjson.dumps(progress.scenario_id),
+        b',"customer_input":', orjson.dumps(progress.customer_input),
+        b',"current_step":2,"total_steps":6,"steps":', SIMULATED_STEPS_JSON,
+        b',"total_duration_ms":200.0,"completed":', b'true' if progress.end_time is not None else b'false',
+        b'}'
+    ))
+    return app.response_class(body, mimetype='application/json')
 
 @app.route('/api/next_scenario', methods=['POST'])
 def next_scenario():
     """Move to next scenario"""
     if app_state.demo_state != "running":
-        return jsonify({'status': 'error', 'message': 'Demo not running'})
+        return json_response({'status': 'error', 'message': 'Demo not running'})
 
     app_state.current_scenario_index += 1
     app_state.current_scenario_id = None
+    app_state.current_progress = None
     app_state.current_scenario_result = None
 
     if app_state.current_scenario_index >= len(app_state.demo_scenarios):
         app_state.demo_state = "completed"
-        return jsonify({'status': 'completed', 'message': 'All scenarios completed'})
+        return json_response({'status': 'completed', 'message': 'All scenarios completed'})
 
-    return jsonify({
+    return json_response({
         'status': 'success',
         'scenario_number': app_state.current_scenario_index + 1,
         'total_scenarios': len(app_state.demo_scenarios)
@@ -249,7 +293,8 @@ def next_scenario():
 @app.route('/api/get_demo_status')
 def get_demo_status():
     """Get demo status"""
-    return jsonify({
+    finish_pending_scenario()
+    return json_response({
         'state': app_state.demo_state,
         'current_scenario': app_state.current_scenario_index + 1 if app_state.demo_scenarios else 0,
         'total_scenarios': len(app_state.demo_scenarios),
@@ -266,10 +311,12 @@ def reset_demo():
     app_state.demo_results = []
     app_state.current_scenario_result = None
     app_state.current_scenario_id = None
+    app_state.current_progress = None
 
     with app_state.progress_lock:
+        app_state.pending_scenario = None
         app_state.pipeline_progress = {}
 
-    return jsonify({'status': 'success'})
+    return json_response({'status': 'success'})
 
 # This is the WSGI application entry point for Vercel
\ No newline at end of file
@@ -1,85 +1,234 @@
 # base.py - Groq base agent
 import time
 import asyncio
+import random
+import hashlib
 import logging
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
-from groq import Groq
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any, Optional, Tuple
+import httpx
+from groq import AsyncGroq, APIStatusError
 from config import config
-from utils import LatencyTracker
+from groq_client import HTTP_TIMEOUT, close_groq_client, get_groq_client
+from utils import LatencyTracker, ResponseCache
 
 logger = logging.getLogger(__name__)
 
+# Retry policy: full-jitter exponential backoff, capped, with Retry-After honoured as a floor.
+# Other 4xx responses (bad request, auth, not found...) fail fast instead of burning retries.
+MAX_BACKOFF_S = 30.0
+MAX_RETRY_AFTER_S = 60.0
+RETRYABLE_CLIENT_STATUSES = frozenset({408, 409, 429})
+
+# Requests at or below this temperature are treated as deterministic and cached
+CACHEABLE_MAX_TEMPERATURE = 0.1
+
+# Process-wide cache shared by every agent; a hit skips the Groq round trip entirely
+_response_cache = ResponseCache(config.response_cache_size, config.response_cache_ttl)
+
+def _retry_after_seconds(response: httpx.Response) -> float:
+    """Seconds requested by a Retry-After header, or 0 if absent or unparseable"""
+    try:
+        return min(max(float(response.headers.get("retry-after", 0)), 0.0), MAX_RETRY_AFTER_S)
+    except ValueError:
+        return 0.0
+
 class BaseAgent(ABC):
     """Base class for all Groq agents"""
     
     def __init__(self):
-        self.client = Groq(
-            api_key="",
-            base_url="https://demo-proxy.groqcloud.dev",
-            default_headers={"Origin": f"https://groq-customer-service-template.vercel.groqcloud.net"}
-        )
         self.metrics = LatencyTracker()
         self.max_retries = config.max_retries
         self.retry_delay = config.retry_delay
-        self.request_timeout = config.request_timeout
+        self.request_timeout = HTTP_TIMEOUT
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.hedged_requests = 0
+        self._verdict_cache: "OrderedDict[bytes, Tuple[bool, Tuple[str, ...]]]" = OrderedDict()
+    
+    @property
+    def client(self) -> AsyncGroq:
+        """Shared pooled Groq client for the current event loop"""
+        return get_groq_client()
+    
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the pooled HTTP connections opened on the current event loop"""
+        await close_groq_client()
     
     async def _make_groq_request(
         self, 
         model: str, 
         messages: List[Dict[str, str]], 
         max_tokens: int = 200,
-        temperature: float = 0.1
+        temperature: float = 0.1,
+        stream: bool = False,
+        stream_until: Optional[Callable[[str], bool]] = None,
+        use_cache: bool = True
     ) -> str:
-        """Make robust request to Groq API with retry logic"""
+        """Make robust request to Groq API with retry logic
+        
+        With stream=True the completion is read incrementally and generation is abandoned as
+        soon as stream_until(text_so_far) returns True. use_cache=False always reaches Groq
+        and stores nothing, for requests (like health checks) that must observe the live API.
+        """
+        
+        cache_key = None
+        if use_cache and temperature <= CACHEABLE_MAX_TEMPERATURE:
+            cache_key = ResponseCache.make_key(model, messages, temperature, max_tokens)
+            cached = _response_cache.get(cache_key)
+            if cached is not None:
+                self.cache_hits += 1
+                logger.debug("Groq response cache hit for %s", model)
+                return cached
+            self.cache_misses += 1
         
-        for attempt in range(self.max_retries):
+        # Bind loop invariants once rather than re-resolving them on every attempt
+        create_completion = self._create_completion
+        max_retries = self.max_retries
+        retry_delay = self.retry_delay
+        request_timeout = self.request_timeout
+        
+        for attempt in range(max_retries):
             try:
-                logger.debug(f"Making Groq request to {model} (attempt {attempt + 1})")
+                logger.debug("Making Groq request to %s (attempt %d)", model, attempt + 1)
                 
                 # Make the API call
-                response = self.client.chat.completions.create(
+                request = dict(
                     model=model,
                     messages=messages,
                     max_tokens=max_tokens,
                     temperature=temperature,
-                    timeout=self.request_timeout
+                    timeout=request_timeout
                 )
+                truncated = False
+                if stream:
+                    content, truncated = await self._stream_completion(request, stream_until)
+                else:
+                    response = await create_completion(**request)
+                    content = response.choices[0].message.content if response.choices else None
                 
-                if not response.choices or not response.choices[0].message.content:
+                if not content:
                     raise ValueError("Empty response from Groq API")
                 
-                content = response.choices[0].message.content.strip()
-                logger.debug(f"Groq request successful: {len(content)} characters")
+                content = content.strip()
+                logger.debug("Groq request successful: %d characters", len(content))
+                # A stream stopped early is a partial completion; caching it under the request's
+                # key would hand the truncated text to later full requests
+                if cache_key is not None and not truncated:
+                    _response_cache.put(cache_key, content)
                 return content
                 
+            except APIStatusError as e:
+                if 400 <= e.status_code < 500 and e.status_code not in RETRYABLE_CLIENT_STATUSES:
+                    logger.error("Groq request to %s rejected with status %d: %s", model, e.status_code, e)
+                    raise Exception(f"Groq API request failed: {e}") from e
+                error, retry_after = e, _retry_after_seconds(e.response)
             except Exception as e:
-                logger.warning(f"Groq request attempt {attempt + 1} failed: {e}")
-                
-                if attempt == self.max_retries - 1:
-                    logger.error(f"All {self.max_retries} attempts failed for model {model}")
-                    raise Exception(f"Groq API request failed after {self.max_retries} attempts: {e}")
-                
-                # Wait before retry with exponential backoff
-                wait_time = self.retry_delay * (2 ** attempt)
-                logger.info(f"Retrying in {wait_time}s...")
-                await asyncio.sleep(wait_time)
+                error, retry_after = e, 0.0
+            
+            logger.warning("Groq request attempt %d failed: %s", attempt + 1, error)
+            
+            if attempt == max_retries - 1:
+                logger.error("All %d attempts failed for model %s", max_retries, model)
+                raise Exception(f"Groq API request failed after {max_retries} attempts: {error}")
+            
+            # Full jitter spreads out retries from concurrent callers failing at the same moment
+            wait_time = max(random.uniform(0, min(retry_delay * (2 ** attempt), MAX_BACKOFF_S)), retry_after)
+            logger.info("Retrying in %.2fs...", wait_time)
+            await asyncio.sleep(wait_time)
+    
+    async def _create_completion(self, **request):
+        """Create a chat completion, hedging slow low-temperature requests with a duplicate"""
+        hedge_after_ms = config.hedge_after_ms
+        if hedge_after_ms <= 0 or request["temperature"] > CACHEABLE_MAX_TEMPERATURE:
+            return await self.client.chat.completions.create(**request)
+        
+        first = asyncio.ensure_future(self.client.chat.completions.create(**request))
+        done, _ = await asyncio.wait({first}, timeout=hedge_after_ms / 1000)
+        if done:
+            return first.result()
+        
+        self.hedged_requests += 1
+        logger.debug("Hedging %s request after %dms", request["model"], hedge_after_ms)
+        second = asyncio.ensure_future(self.client.chat.completions.create(**request))
+        pending = {first, second}
+        try:
+            # Take the first successful response; only fail if both attempts fail
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
     
-    def _track_latency(self, start_time: float) -> float:
-        """Calculate and track latency with logging"""
-        latency = (time.perf_counter() - start_time) * 1000
-        self.metrics.add_measurement(latency)
+    async def _stream_completion(self, request: Dict[str, Any], until: Optional[Callable[[str], bool]]) -> Tuple[str, bool]:
+        """Stream a chat completion, closing the connection early once until(text) is satisfied
         
-        return latency
+        Returns the text and whether the stream was stopped before the model finished.
+        """
+        stream = await self.client.chat.completions.create(**request, stream=True)
+        text = ""
+        stopped_early = False
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    text += chunk.choices[0].delta.content
+                    if until is not None and until(text):
+                        logger.debug("Stopping %s stream early after %d characters", request["model"], len(text))
+                        stopped_early = True
+                        break
+        finally:
+            # Closing the response stops the server from generating the remaining tokens
+            await stream.close()
+        return text, stopped_early
+    
+    def _track_latency_ns(self, start_ns: int) -> float:
+        """Track latency from a perf_counter_ns() start and return it in milliseconds"""
+        latency_ns = time.perf_counter_ns() - start_ns
+        self.metrics.add_measurement_ns(latency_ns)
+        return latency_ns / 1_000_000
+    
+    @staticmethod
+    def _content_key(content: str, namespace: bytes = b"") -> bytes:
+        """Compact cache key for a piece of content (namespace keeps key families apart)"""
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16, person=namespace).digest()
+    
+    def _get_cached_verdict(self, key: bytes) -> Optional[Tuple[bool, Tuple[str, ...]]]:
+        """Look up a previously computed (passes, issues) verdict"""
+        verdict = self._verdict_cache.get(key)
+        if verdict is not None:
+            self._verdict_cache.move_to_end(key)
+        return verdict
+    
+    def _cache_verdict(self, key: bytes, passes: bool, issues: Tuple[str, ...]) -> None:
+        """Store a verdict, evicting the least recently used entry when full"""
+        if config.verdict_cache_size <= 0:
+            return
+        self._verdict_cache[key] = (passes, tuple(issues))
+        if len(self._verdict_cache) > config.verdict_cache_size:
+            self._verdict_cache.popitem(last=False)
     
     def get_performance_stats(self) -> Dict[str, float]:
         """Get performance statistics for this agent"""
-        return self.metrics.get_stats()
+        stats = self.metrics.get_stats()
+        stats["cache_hits"] = self.cache_hits
+        stats["cache_misses"] = self.cache_misses
+        stats["hedged_requests"] = self.hedged_requests
+        return stats
     
     def reset_metrics(self) -> None:
         """Reset performance metrics"""
         self.metrics = LatencyTracker()
-        logger.info(f"Metrics reset for {self.__class__.__name__}")
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.hedged_requests = 0
+        logger.info("Metrics reset for %s", self.__class__.__name__)
     
     async def health_check(self) -> bool:
         """Perform health check on the Groq connection"""
@@ -87,10 +236,11 @@ class BaseAgent(ABC):
             test_response = await self._make_groq_request(
                 model=config.guard_model,
                 messages=[{"role": "user", "content": "test"}],
-                max_tokens=10
+                max_tokens=10,
+                use_cache=False  # A cached reply would report healthy while the API is down
             )
             logger.info("Groq health check passed")
             return True
         except Exception as e:
-            logger.error(f"Groq health check failed: {e}")
+            logger.error("Groq health check failed: %s", e)
             return False
\ No newline at end of file
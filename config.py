@@ -1,6 +1,10 @@
 # config.py - Groq configuration
+import atexit
+import queue
 import logging
-from dataclasses import dataclass
+import logging.handlers
+import functools
+from dataclasses import dataclass, make_dataclass
 from typing import Dict
 from pydantic import validator
 from pydantic_settings import BaseSettings
@@ -29,6 +33,15 @@ class GroqConfig(BaseSettings):
     request_timeout: int = 30
     max_retries: int = 3
     retry_delay: float = 1.0
+    verdict_cache_size: int = 1024  # Cached safety/tone verdicts per agent (0 disables)
+    max_concurrency: int = 16  # In-flight Groq requests per batch call
+    response_cache_size: int = 4096  # Cached low-temperature Groq responses (0 disables)
+    response_cache_ttl: int = 3600
+    hedge_after_ms: int = 0  # Fire a duplicate low-temperature request after this delay (0 disables)
+    guard_prefilter_max_chars: int = 0  # Customer inputs up to this length may skip LlamaGuard (0 disables)
+    guard_error_policy: str = "block"  # Verdict when LlamaGuard is unreachable: "block" or "allow"
+    response_similarity_threshold: float = 0.0  # Reuse responses for near-identical inputs (lexical word-pair Jaccard, not semantic; 0 disables)
+    faq_path: str = ""  # JSON file of regex -> canned reply pairs answered without Groq (empty disables)
     
     # Pipeline Configuration
     max_pipeline_ms: int = 200
@@ -57,6 +70,13 @@ class GroqConfig(BaseSettings):
             raise ValueError(f'log_level must be one of {valid_levels}')
         return v.upper()
     
+    @validator('guard_error_policy')
+    def validate_guard_error_policy(cls, v):
+        valid_policies = ['block', 'allow']
+        if v.lower() not in valid_policies:
+            raise ValueError(f'guard_error_policy must be one of {valid_policies}')
+        return v.lower()
+    
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
@@ -64,9 +84,18 @@ class GroqConfig(BaseSettings):
         "extra": "ignore"  # This allows extra fields to be ignored instead of causing errors
     }
 
+# Settings are read-only after startup, so the validated values are copied into a frozen,
+# slotted dataclass; its attribute reads are cheaper than pydantic's on hot paths
+FrozenGroqConfig = make_dataclass(
+    "FrozenGroqConfig",
+    [(name, field.annotation) for name, field in GroqConfig.model_fields.items()],
+    frozen=True,
+    slots=True
+)
+
 # Global configuration instance
 try:
-    config = GroqConfig()
+    config = FrozenGroqConfig(**GroqConfig().model_dump())
 except Exception as e:
     print(f"❌ Configuration Error: {e}")
     print("Please ensure GROQ_API_KEY is set in your environment or .env file")
@@ -88,9 +117,12 @@ class ModelConfig:
 # Customer Service Prompts - Now Customizable
 def get_response_prompt(company_name: str = None, domain: str = None) -> str:
     """Get customizable response generation prompt"""
-    company = company_name or config.company_name
-    service_domain = domain or config.company_domain
-    
+    return _build_response_prompt(
+        company_name or config.company_name, domain or config.company_domain, config.brand_voice
+    )
+
+@functools.lru_cache(maxsize=8)
+def _build_response_prompt(company: str, service_domain: str, brand_voice: str) -> str:
     return f"""
 You are a {company} {service_domain} representative. Generate professional, empathetic responses that solve customer problems.
 
@@ -100,7 +132,7 @@ RESPONSE REQUIREMENTS:
 ✓ Start with empathy and understanding
 ✓ Take ownership of the customer's concern
 ✓ Keep answers short, professional, and to the point
-✓ Maintain {config.brand_voice} tone throughout
+✓ Maintain {brand_voice} tone throughout
 
 PROFESSIONAL LANGUAGE STANDARDS:
 ✓ Use: "promptly", "immediately", "as soon as possible"
@@ -124,9 +156,10 @@ Generate a professional {service_domain} response to this message:
 
 def get_tone_validation_prompt(company_name: str = None, domain: str = None) -> str:
     """Get customizable tone validation prompt"""
-    company = company_name or config.company_name
-    service_domain = domain or config.company_domain
-    
+    return _build_tone_validation_prompt(company_name or config.company_name, domain or config.company_domain)
+
+@functools.lru_cache(maxsize=8)
+def _build_tone_validation_prompt(company: str, service_domain: str) -> str:
     return f"""
 You are evaluating {service_domain} responses for {company}'s professional standards.
 
@@ -161,9 +194,10 @@ Evaluate this {service_domain} response:
 
 def get_rewrite_prompt(company_name: str = None, domain: str = None) -> str:
     """Get customizable rewrite prompt"""
-    company = company_name or config.company_name
-    service_domain = domain or config.company_domain
-    
+    return _build_rewrite_prompt(company_name or config.company_name, domain or config.company_domain)
+
+@functools.lru_cache(maxsize=8)
+def _build_rewrite_prompt(company: str, service_domain: str) -> str:
     return f"""
 You are rewriting {service_domain} responses to meet {company}'s professional excellence standards.
 
@@ -220,13 +254,27 @@ def validate_environment() -> Dict[str, bool]:
 
 def setup_logging():
     """Setup logging"""
+    formatter = logging.Formatter(config.log_format)
+    output_handlers = [
+        logging.StreamHandler(),
+        # delay=True: the log file is only opened when the first record is written
+        logging.FileHandler('groq_pipeline.log', delay=True)
+    ]
+    for handler in output_handlers:
+        handler.setFormatter(formatter)
+    
+    # Callers only enqueue records; a background listener thread does the console and file I/O
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *output_handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Message-only formatter so the listener's handlers apply config.log_format exactly once
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
     logging.basicConfig(
         level=getattr(logging, config.log_level),
-        format=config.log_format,
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler('groq_pipeline.log')
-        ]
+        handlers=[queue_handler]
     )
     return logging.getLogger(__name__)
 
@@ -0,0 +1,57 @@
+# groq_client.py - Shared Groq client and HTTP connection pool
+import asyncio
+import weakref
+from typing import Any
+import httpx
+import orjson
+from groq import AsyncGroq
+from config import config
+
+GROQ_BASE_URL = "https://demo-proxy.groqcloud.dev"
+GROQ_DEFAULT_HEADERS = {"Origin": "https://groq-customer-service-template.vercel.groqcloud.net"}
+# Keep enough idle connections for a full batch fan-out (MAX_CONCURRENCY) to reuse them
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+# Fail fast on unreachable hosts; reads (including streamed ones) get the configured budget
+HTTP_TIMEOUT = httpx.Timeout(config.request_timeout, connect=2.0)
+
+# One pooled client per event loop, shared by every agent. httpx connections are bound to
+# the loop that opened them, and the pipeline can run on more than one loop: main's
+# asyncio.run loop (startup validation, direct calls) and the review UI's shared background
+# loop, which human_loop starts when its web interface is launched outside a running loop.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncGroq]" = weakref.WeakKeyDictionary()
+
+class OrjsonAsyncClient(httpx.AsyncClient):
+    """httpx client that encodes JSON request bodies with orjson instead of the stdlib"""
+    
+    def build_request(self, *args, json: Any = None, **kwargs) -> httpx.Request:
+        if json is not None and kwargs.get("content") is None:
+            try:
+                # The Groq SDK already sends Content-Type: application/json
+                kwargs["content"] = orjson.dumps(json)
+                json = None
+            except TypeError:
+                pass
+        return super().build_request(*args, json=json, **kwargs)
+
+def get_groq_client() -> AsyncGroq:
+    """Return the shared AsyncGroq client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncGroq(
+            api_key="",
+            base_url=GROQ_BASE_URL,
+            default_headers=GROQ_DEFAULT_HEADERS,
+            max_retries=0,  # BaseAgent._make_groq_request owns the retry policy
+            timeout=HTTP_TIMEOUT,
+            http_client=OrjsonAsyncClient(limits=HTTP_POOL_LIMITS, timeout=HTTP_TIMEOUT)
+        )
+        _clients[loop] = client
+    return client
+
+async def close_groq_client() -> None:
+    """Close the pooled HTTP connections opened on the current event loop"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
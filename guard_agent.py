@@ -1,5 +1,7 @@
 # guard_agent.py - Groq safety moderation
+import re
 import time
+import asyncio
 import logging
 from typing import Tuple
 from base import BaseAgent
@@ -8,149 +10,210 @@ from utils import ModerationResult
 
 logger = logging.getLogger(__name__)
 
-class GuardAgent(BaseAgent):
-    """LlamaGuard-powered content safety moderation"""
-    
-    def __init__(self):
-        super().__init__()
-        self.model = config.guard_model
-        
-        # LlamaGuard taxonomy for comprehensive safety checking
-        self.llamaguard_taxonomy = """
-You are a safety classifier using LlamaGuard standards. Classify content as SAFE or UNSAFE based on these categories:
-
-O1: Violence & Hate
-- Statements encouraging or helping plan violence
-- Discrimination, slurs, hateful sentiments based on race, color, religion, national origin, sexual orientation, gender, gender identity, disability
-
-O2: Sexual Content  
-- Encouraging sexual acts (especially with minors)
-- Sexually explicit/erotic content
+# Punctuation, symbols and whitespace runs collapse to one space when normalizing content
+_NON_WORD_RE = re.compile(r"[\W_]+")
 
-O3: Guns & Illegal Weapons
-- Encouraging, condoning, or helping plan illegal weapon acquisition or use
-- Instructions for making weapons, explosives, dangerous chemicals
+# LlamaGuard response patterns; IGNORECASE lets the parser scan the raw response without upper()
+_SAFE_ONLY_RE = re.compile(r"\s*safe\s*", re.IGNORECASE)
+_UNSAFE_RE = re.compile(r"unsafe", re.IGNORECASE)
+# Category codes O1-O6, in taxonomy order
+_CATEGORY_RE = re.compile(r"O([1-6])", re.IGNORECASE)
+_CATEGORY_NAMES = ("violence_hate", "sexual_content", "weapons", "substances", "self_harm", "criminal_planning")
+_UNSAFE_KEYWORD_RE = re.compile(r"harmful|violation|inappropriate|dangerous", re.IGNORECASE)
 
-O4: Regulated Substances
-- Promoting illegal production/use of controlled substances
-- Instructions for drug manufacturing or distribution
+# Opt-in local pre-filter: short customer inputs made only of plain ASCII text, with no term from
+# this lexicon, are treated as benign without a LlamaGuard call. The lexicon is English-only, so
+# anything outside ASCII always goes to the model. Terms match whole words plus common
+# inflections ("kill" hits "killing" but "ass" does not hit "assist").
+_PREFILTER_CHARSET_RE = re.compile(r"[A-Za-z0-9\s.,?!'\-]+")
+_PREFILTER_LEXICON = (
+    # violence & hate
+    "kill", "murder", "hurt", "attack", "assault", "beat", "shoot", "stab", "threat", "destroy",
+    "hate", "racist", "slur", "nazi", "terror",
+    # abuse & profanity
+    "idiot", "stupid", "moron", "dumb", "useless", "garbage", "trash", "damn", "hell", "heck",
+    "crap", "shit", "fuck", "bitch", "bastard", "ass",
+    # sexual content
+    "sex", "nude", "naked", "porn", "rape", "minor", "child",
+    # weapons
+    "gun", "rifle", "pistol", "weapon", "bomb", "explosive", "ammo", "knife", "poison",
+    "molotov", "napalm", "grenade",
+    # regulated substances
+    "drug", "cocaine", "heroin", "meth", "weed", "fentanyl", "overdose",
+    # suicide & self-harm
+    "suicide", "self-harm", "cut myself", "end my life", "die",
+    # criminal planning
+    "steal", "fraud", "scam", "hack", "launder", "kidnap", "arson", "blackmail", "extort", "blast",
+    # veiled threats
+    "where you live", "make you pay", "find you",
+)
+_PREFILTER_LEXICON_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(term) for term in _PREFILTER_LEXICON) + r")(?:s|es|ed|ing|er|ers)?\b",
+    re.IGNORECASE
+)
 
-O5: Suicide & Self-Harm
-- Encouraging self-harm or suicide
-- Providing harmful advice instead of mental health resources
+def is_obviously_benign(content: str, max_chars: int) -> bool:
+    """Cheap local check for short, plain-text inputs with no risky vocabulary"""
+    return (
+        0 < len(content) <= max_chars
+        and _PREFILTER_CHARSET_RE.fullmatch(content) is not None
+        and _PREFILTER_LEXICON_RE.search(content) is None
+    )
 
-O6: Criminal Planning
-- Encouraging, condoning, or helping plan criminal activities (arson, kidnapping, theft, fraud)
-- Only use when content doesn't fit other violation categories
+def normalize_content(content: str) -> str:
+    """Case- and punctuation-insensitive form of content used for near-duplicate lookups"""
+    return _NON_WORD_RE.sub(" ", content.casefold()).strip()
 
-Respond with:
-- "SAFE" if content doesn't violate any category
-- "UNSAFE: [Category]" if content violates categories (e.g., "UNSAFE: O1, O3")
+class GuardAgent(BaseAgent):
+    """LlamaGuard-powered content safety moderation"""
+    
+    # LlamaGuard taxonomy legend (shared by all instances). Kept short and byte-identical on
+    # every call: prefill cost scales with prompt length and a stable prefix can be cached.
+    LLAMAGUARD_TAXONOMY = """Classify content as SAFE or UNSAFE using these categories:
+O1 Violence & Hate: encouraging or planning violence; slurs or hate based on protected attributes
+O2 Sexual Content: sexually explicit content; any sexual content involving minors
+O3 Guns & Illegal Weapons: illegal weapon acquisition or use; making weapons, explosives, dangerous chemicals
+O4 Regulated Substances: illegal production, use or distribution of controlled substances
+O5 Suicide & Self-Harm: encouraging self-harm or suicide
+O6 Criminal Planning: other crimes such as arson, kidnapping, theft, fraud
+Reply "SAFE", or "UNSAFE: <codes>" (e.g. "UNSAFE: O1, O3").
 """
     
-    async def check_safety(self, content: str) -> Tuple[ModerationResult, float]:
+    def __init__(self):
+        super().__init__()
+        self.model = config.guard_model
+        self.max_tokens = config.max_tokens_guard
+    
+    async def check_safety(self, content: str, allow_prefilter: bool = False) -> Tuple[ModerationResult, float]:
         """Check content for safety violations using LlamaGuard"""
-        start = time.perf_counter()
+        start_ns = time.perf_counter_ns()
         
-        try:
-            logger.debug(f"Running safety check on content: {content[:50]}...")
-            
-            response = await self._llamaguard_safety_check(content)
-            latency = self._track_latency(start)
-            
-            # Parse response for safety determination
-            is_safe, violations = self._parse_llamaguard_response(response)
-            
-            result = ModerationResult(
+        # Only customer inputs opt in to the (config-enabled) pre-filter; generated responses
+        # always go to LlamaGuard
+        if allow_prefilter and is_obviously_benign(content, config.guard_prefilter_max_chars):
+            latency = (time.perf_counter_ns() - start_ns) / 1_000_000
+            logger.debug("Safety check skipped by local pre-filter")
+            return ModerationResult(
+                passes=True,
+                confidence=0.99,
+                issues=(),
+                latency_ms=latency
+            ), latency
+        
+        # Identical content (e.g. a response already checked) skips the Groq round trip.
+        # Near-duplicates that differ only in case/punctuation reuse earlier SAFE verdicts;
+        # UNSAFE verdicts are only ever reused for an exact match.
+        cache_key = self._content_key(content)
+        normalized_key = self._content_key(normalize_content(content), b"normalized")
+        cached = self._get_cached_verdict(cache_key) or self._get_cached_verdict(normalized_key)
+        if cached is not None:
+            is_safe, violations = cached
+            latency = (time.perf_counter_ns() - start_ns) / 1_000_000
+            logger.debug("Safety check cache hit (%s)", "PASSED" if is_safe else "FAILED")
+            return ModerationResult(
                 passes=is_safe,
                 confidence=0.95,
-                issues=violations if not is_safe else [],
+                issues=violations,
                 latency_ms=latency
-            )
-            
-            logger.info(f"Safety check {'PASSED' if is_safe else 'FAILED'} in {latency:.1f}ms")
-            if not is_safe:
-                logger.warning(f"Safety violations detected: {violations}")
-            
-            return result, latency
-            
+            ), latency
+        
+        logger.debug("Running safety check on content: %.50s...", content)
+        
+        # Only the Groq call is guarded; transient failures were already retried one level down.
+        # Whether an unreachable guard lets content through is an explicit config decision.
+        try:
+            response = await self._llamaguard_safety_check(content)
         except Exception as e:
-            latency = self._track_latency(start)
-            logger.error(f"Safety check failed: {e}")
-            
-            # Return safe result on error to avoid blocking pipeline
+            latency = self._track_latency_ns(start_ns)
+            logger.error("Safety check failed (policy: %s): %s", config.guard_error_policy, e)
             return ModerationResult(
-                passes=True,
+                passes=config.guard_error_policy == "allow",
                 confidence=0.0,
-                issues=["safety_check_error"],
+                issues=("safety_check_error",),
                 latency_ms=latency
             ), latency
+        
+        latency = self._track_latency_ns(start_ns)
+        
+        # Parse response for safety determination
+        is_safe, violations = self._parse_llamaguard_response(response)
+        self._cache_verdict(cache_key, is_safe, violations)
+        if is_safe:
+            self._cache_verdict(normalized_key, True, ())
+        
+        result = ModerationResult(
+            passes=is_safe,
+            confidence=0.95,
+            issues=violations,
+            latency_ms=latency
+        )
+        
+        logger.info("Safety check %s in %.1fms", "PASSED" if is_safe else "FAILED", latency)
+        if not is_safe:
+            logger.warning("Safety violations detected: %s", violations)
+        
+        return result, latency
     
     async def _llamaguard_safety_check(self, content: str) -> str:
         """Use LlamaGuard directly for safety checking"""
         return await self._make_groq_request(
             model=self.model,
             messages=[
-                {"role": "system", "content": self.llamaguard_taxonomy},
+                {"role": "system", "content": self.LLAMAGUARD_TAXONOMY},
                 {"role": "user", "content": f"Classify this content:\n\n{content}"}
             ],
-            max_tokens=config.max_tokens_guard
+            max_tokens=self.max_tokens
         )
     
-    def _parse_llamaguard_response(self, response: str) -> Tuple[bool, list[str]]:
+    def _parse_llamaguard_response(self, response: str) -> Tuple[bool, Tuple[str, ...]]:
         """Parse safety response using LlamaGuard format"""
-        response_clean = response.strip().upper()
+        # Fast path: LlamaGuard usually answers with a bare "safe"
+        if _SAFE_ONLY_RE.fullmatch(response):
+            return True, ()
         
         # Check for unsafe indicators
-        if "UNSAFE" in response_clean:
-            violations = []
-            
-            # Extract violation categories (O1, O2, etc.)
-            category_names = {
-                "O1": "violence_hate",
-                "O2": "sexual_content", 
-                "O3": "weapons",
-                "O4": "substances",
-                "O5": "self_harm",
-                "O6": "criminal_planning"
-            }
-            
-            for category, name in category_names.items():
-                if category in response_clean:
-                    violations.append(name)
+        if _UNSAFE_RE.search(response):
+            # Extract violation categories (O1, O2, etc.) in one regex pass
+            violations = tuple(_CATEGORY_NAMES[int(n) - 1] for n in sorted(set(_CATEGORY_RE.findall(response))))
             
             # Fallback if no specific categories found
             if not violations:
-                violations = ["content_violation"]
+                violations = ("content_violation",)
                 
             return False, violations
         
         # Additional safety checks for edge cases
-        unsafe_keywords = ["harmful", "violation", "inappropriate", "dangerous"]
-        if any(keyword in response_clean for keyword in unsafe_keywords):
-            return False, ["potential_violation"]
+        if _UNSAFE_KEYWORD_RE.search(response):
+            return False, ("potential_violation",)
             
-        return True, []
+        return True, ()
     
     async def check_multiple_contents(self, contents: list[str]) -> list[Tuple[ModerationResult, float]]:
         """Batch safety checking for multiple contents"""
-        logger.info(f"Running batch safety check on {len(contents)} items")
+        logger.info("Running batch safety check on %d items", len(contents))
+        
+        # Checks are independent requests; run them concurrently, capped to respect rate limits
+        semaphore = asyncio.Semaphore(config.max_concurrency)
         
-        results = []
-        for i, content in enumerate(contents):
-            logger.debug(f"Checking item {i+1}/{len(contents)}")
-            result = await self.check_safety(content)
-            results.append(result)
+        async def check_one(i: int, content: str) -> Tuple[ModerationResult, float]:
+            async with semaphore:
+                logger.debug("Checking item %d/%d", i + 1, len(contents))
+                return await self.check_safety(content)
         
-        return results
+        return list(await asyncio.gather(*(check_one(i, c) for i, c in enumerate(contents))))
     
     def get_safety_summary(self, results: list[ModerationResult]) -> dict:
         """Get summary statistics for safety checks"""
-        total = len(results)
-        passed = sum(1 for r in results if r.passes)
+        # Single pass over the results
+        total = passed = 0
+        latency_sum = 0.0
+        for r in results:
+            total += 1
+            passed += r.passes
+            latency_sum += r.latency_ms
         failed = total - passed
         
-        avg_latency = sum(r.latency_ms for r in results) / total if total > 0 else 0
+        avg_latency = latency_sum / total if total > 0 else 0
         
         return {
             "total_checks": total,
@@ -3,33 +3,35 @@ import time
 import asyncio
 import logging
 import os
-from flask import Flask, request, jsonify
+import orjson
+from flask import Flask, Response, request
 from threading import Thread
+from collections import OrderedDict, deque
 from dataclasses import dataclass
 from typing import Optional, Dict, Any, List
-import queue
-import uuid
+import hashlib
+import itertools
 import threading
 
+from base import BaseAgent
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class PipelineStep:
-    """Individual pipeline step with timing"""
+    """Individual pipeline step with timing (time.monotonic_ns timestamps)"""
     step_name: str
-    start_time: float
-    end_time: Optional[float] = None
+    start_ns: int
+    end_ns: Optional[int] = None
     status: str = "running"  # running, completed, failed
     details: str = ""
     model_used: Optional[str] = None
     
     @property
     def duration_ms(self) -> float:
-        if self.end_time:
-            return (self.end_time - self.start_time) * 1000
-        return (time.time() - self.start_time) * 1000
+        return ((self.end_ns or time.monotonic_ns()) - self.start_ns) / 1_000_000
 
-@dataclass
+@dataclass(slots=True)
 class PipelineProgress:
     """Complete pipeline progress tracking"""
     scenario_id: str
@@ -37,13 +39,14 @@ class PipelineProgress:
     steps: List[PipelineStep]
     current_step: int = 0
     total_steps: int = 6
-    start_time: float = None
-    end_time: Optional[float] = None
+    start_ns: Optional[int] = None
+    end_ns: Optional[int] = None
+    frozen_payload: Optional[bytes] = None  # Serialized progress response, set once the pipeline ends
     
     def add_step(self, step_name: str, details: str = "", model_used: str = None):
         step = PipelineStep(
             step_name=step_name,
-            start_time=time.time(),
+            start_ns=time.monotonic_ns(),
             details=details,
             model_used=model_used
         )
@@ -54,12 +57,25 @@ class PipelineProgress:
     def complete_current_step(self, details: str = "", status: str = "completed"):
         if self.steps:
             current = self.steps[-1]
-            current.end_time = time.time()
+            current.end_ns = time.monotonic_ns()
             current.status = status
             if details:
                 current.details = details
+    
+    def record_step(self, step_name: str, details: str, duration_ms: float,
+                    status: str = "completed", model_used: str = None):
+        end_ns = time.monotonic_ns()
+        self.steps.append(PipelineStep(
+            step_name=step_name,
+            start_ns=end_ns - int(duration_ms * 1_000_000),
+            end_ns=end_ns,
+            status=status,
+            details=details,
+            model_used=model_used
+        ))
+        self.current_step = len(self.steps)
 
-@dataclass
+@dataclass(slots=True)
 class HumanReviewResult:
     """Result from human review process"""
     original_response: str
@@ -71,6 +87,9 @@ class HumanReviewResult:
 class HumanLoopManager:
     """Human review interface for Groq pipeline"""
     
+    # Progress is kept for the most recent scenarios only, so long sessions stay flat in memory
+    MAX_TRACKED_PIPELINES = 64
+    
     def __init__(self):
         self.app = Flask(__name__)
         
@@ -78,28 +97,50 @@ class HumanLoopManager:
         self.app.logger.setLevel(logging.WARNING)
         logging.getLogger('werkzeug').setLevel(logging.WARNING)
         
+        # POST bodies are tiny JSON documents; reject anything larger outright (413)
+        self.app.config['MAX_CONTENT_LENGTH'] = 1 << 16
+        
         # Review management
-        self.review_queue = queue.Queue()
-        self.result_queue = queue.Queue()
+        # Plain FIFO: append/popleft are atomic under the GIL, and the only consumer is the
+        # polling /api/get_review route, so no blocking wakeups are needed
+        self.review_queue: deque = deque()
+        # Created on first use by request_review so it binds to the loop that awaits it
+        self.result_queue: Optional[asyncio.Queue] = None
+        self._result_loop: Optional[asyncio.AbstractEventLoop] = None
         self.active_reviews = {}  # {review_id: review_data}
+        # Review ids only need to be unique within this process; next() on a count is atomic under the GIL
+        self._review_ids = itertools.count(1)
         self.review_lock = threading.Lock()
         
         # Pipeline progress tracking
-        self.pipeline_progress = {}  # {scenario_id: PipelineProgress}
-        self.progress_lock = threading.Lock()
+        # {scenario_id: PipelineProgress}. Lock-free: each scenario's progress has a single writer
+        # (its pipeline task), readers take snapshots, and resets rebind rather than mutate.
+        self.pipeline_progress: OrderedDict = OrderedDict()
+        # Bumped on every progress change; wakes /api/progress_stream subscribers
+        self._progress_changed = threading.Condition()
+        self._progress_version = 0
         
         # Demo management
         self.demo_instance = None
-        self.demo_scenarios = []
+        self._processor = None  # async (input, scenario_id, tracker) -> result
+        self.demo_scenarios = ()
+        self._scenario_etags = ()  # One ETag per scenario index, for /api/get_current_scenario
         self.current_scenario_index = 0
         self.demo_results = []
         self.current_scenario_result = None  # Track current scenario result separately
         self.demo_state = "idle"  # idle, running, paused, completed
         self.current_scenario_id = None
         
+        # Dashboard page, read once and served from memory
+        self.reload_template()
+        
         # Server state
         self.server_thread = None
         self.is_running = False
+        # Loop scenario pipelines run on: the application loop, or one shared background loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[Thread] = None  # Set only when this manager owns the loop
+        self._loop_lock = threading.Lock()
         
         self.setup_routes()
         logger.info("HumanLoopManager initialized with enhanced pipeline tracking")
@@ -110,58 +151,53 @@ class HumanLoopManager:
         @self.app.route('/')
         def index():
             """Main demo interface"""
-            try:
-                # Read template from file
-                template_path = os.path.join(os.path.dirname(__file__), 'template.html')
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    template_content = f.read()
-                return template_content
-            except FileNotFoundError:
-                return "Template file not found", 404
-            except Exception as e:
-                logger.error(f"Error reading template: {e}")
-                return "Error loading template", 500
+            return self._template_bytes, self._template_status, {'Content-Type': 'text/html; charset=utf-8'}
         
         @self.app.route('/api/get_review')
         def get_review():
             """Get next review item"""
             try:
-                review_data = self.review_queue.get_nowait()
-                review_id = str(uuid.uuid4())
+                review_data = self.review_queue.popleft()
+                review_id = f"r{next(self._review_ids)}"
+                active_review = {
+                    **review_data,
+                    'review_id': review_id,
+                    'start_ns': time.monotonic_ns()
+                }
                 
+                # Build outside the lock; hold it only for the insert
                 with self.review_lock:
-                    self.active_reviews[review_id] = {
-                        **review_data,
-                        'review_id': review_id,
-                        'start_time': time.time()
-                    }
+                    self.active_reviews[review_id] = active_review
                 
                 logger.debug(f"Serving review {review_id}")
-                return jsonify({
+                return self._json({
                     'review_id': review_id,
                     'customer_input': review_data['customer_input'],
                     'ai_response': review_data['ai_response'],
                     'status': 'success'
                 })
                 
-            except queue.Empty:
-                return jsonify({'status': 'no_reviews'})
+            except IndexError:
+                return self._json({'status': 'no_reviews'})
         
         @self.app.route('/api/submit_review', methods=['POST'])
         def submit_review():
             """Submit review result"""
             try:
-                data = request.json
+                data = self._request_data()
                 review_id = data.get('review_id')
                 
-                if not review_id or review_id not in self.active_reviews:
-                    return jsonify({'status': 'error', 'message': 'Invalid review ID'})
-                
+                # Claim the review and grab the delivery target in one short critical section;
+                # everything else happens after the lock is released
                 with self.review_lock:
-                    review_data = self.active_reviews.pop(review_id)
+                    review_data = self.active_reviews.pop(review_id, None) if review_id else None
+                    result_loop, result_queue = self._result_loop, self.result_queue
+                
+                if review_data is None:
+                    return self._json({'status': 'error', 'message': 'Invalid review ID'})
                 
                 # Calculate review time
-                review_time = (time.time() - review_data['start_time']) * 1000
+                review_time = (time.monotonic_ns() - review_data['start_ns']) / 1_000_000
                 
                 # Create result
                 result = HumanReviewResult(
@@ -172,28 +208,28 @@ class HumanLoopManager:
                     review_notes=data.get('notes')
                 )
                 
-                # Send result back to pipeline
-                self.result_queue.put(result)
+                # Send result back to pipeline; asyncio.Queue is not thread-safe, so hand it to its loop
+                result_loop.call_soon_threadsafe(result_queue.put_nowait, result)
                 
                 logger.info(f"Review {review_id} completed in {review_time:.1f}ms")
-                return jsonify({'status': 'success'})
+                return self._json({'status': 'success'})
                 
             except Exception as e:
                 logger.error(f"Review submission failed: {e}")
-                return jsonify({'status': 'error', 'message': str(e)})
+                return self._json({'status': 'error', 'message': str(e)})
         
         @self.app.route('/api/start_interactive_demo', methods=['POST'])
         def start_interactive_demo():
             """Start interactive demo mode"""
             if not self.demo_instance:
-                return jsonify({'status': 'error', 'message': 'Demo not initialized'})
+                return self._json({'status': 'error', 'message': 'Demo not initialized'})
             
             self.demo_state = "running"
             self.current_scenario_index = 0
             self.demo_results = []
-            self.pipeline_progress = {}
+            self.pipeline_progress = OrderedDict()
             
-            return jsonify({
+            return self._json({
                 'status': 'success',
                 'total_scenarios': len(self.demo_scenarios),
                 'current_scenario': self.current_scenario_index + 1 if self.demo_scenarios else 0
@@ -203,83 +239,84 @@ class HumanLoopManager:
         def get_current_scenario():
             """Get current scenario for interactive demo"""
             if self.demo_state != "running" or self.current_scenario_index >= len(self.demo_scenarios):
-                return jsonify({'status': 'no_scenario'})
+                return self._json({'status': 'no_scenario'})
             
-            scenario = self.demo_scenarios[self.current_scenario_index]
-            return jsonify({
+            # The payload only changes when the scenario advances; let polling clients revalidate
+            index = self.current_scenario_index
+            etag = self._scenario_etags[index]
+            if request.headers.get('If-None-Match') == etag:
+                return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+            
+            response = self._json({
                 'status': 'success',
-                'scenario': scenario,
-                'scenario_number': self.current_scenario_index + 1,
+                'scenario': self.demo_scenarios[index],
+                'scenario_number': index + 1,
                 'total_scenarios': len(self.demo_scenarios),
                 'can_process': True
             })
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
         
         @self.app.route('/api/process_current_scenario', methods=['POST'])
         def process_current_scenario():
             """Process current scenario in interactive mode"""
             if self.demo_state != "running" or self.current_scenario_index >= len(self.demo_scenarios):
-                return jsonify({'status': 'error', 'message': 'No scenario available'})
+                return self._json({'status': 'error', 'message': 'No scenario available'})
             
             scenario = self.demo_scenarios[self.current_scenario_index]
             scenario_id = f"interactive_{self.current_scenario_index + 1}"
             self.current_scenario_id = scenario_id
             
             # Initialize pipeline progress
-            with self.progress_lock:
-                self.pipeline_progress[scenario_id] = PipelineProgress(
-                    scenario_id=scenario_id,
-                    customer_input=scenario,
-                    steps=[],
-                    start_time=time.time()
-                )
+            self._start_progress(scenario_id, scenario)
             
-            self._start_scenario_processing(scenario, self.current_scenario_index + 1, scenario_id)
+            self._submit(self._process_scenario_async(scenario, self.current_scenario_index + 1, scenario_id))
             
-            return jsonify({'status': 'processing', 'scenario_id': scenario_id})
+            return self._json({'status': 'processing', 'scenario_id': scenario_id})
         
         @self.app.route('/api/get_pipeline_progress')
         def get_pipeline_progress():
             """Get current pipeline progress"""
             if not self.current_scenario_id:
-                return jsonify({'status': 'no_progress'})
+                return self._json({'status': 'no_progress'})
             
-            with self.progress_lock:
-                progress = self.pipeline_progress.get(self.current_scenario_id)
-                if not progress:
-                    return jsonify({'status': 'no_progress'})
-                
-                steps_data = []
-                for step in progress.steps:
-                    steps_data.append({
-                        'step_name': step.step_name,
-                        'status': step.status,
-                        'details': step.details,
-                        'duration_ms': step.duration_ms,
-                        'model_used': step.model_used
-                    })
-                
-                total_duration = 0
-                if progress.end_time:
-                    total_duration = (progress.end_time - progress.start_time) * 1000
-                elif progress.start_time:
-                    total_duration = (time.time() - progress.start_time) * 1000
-                
-                return jsonify({
-                    'status': 'success',
-                    'scenario_id': progress.scenario_id,
-                    'customer_input': progress.customer_input,
-                    'current_step': progress.current_step,
-                    'total_steps': progress.total_steps,
-                    'steps': steps_data,
-                    'total_duration_ms': total_duration,
-                    'completed': progress.end_time is not None
-                })
+            progress = self.pipeline_progress.get(self.current_scenario_id)
+            # A finished pipeline's response never changes; serve the bytes captured at completion
+            if progress and progress.frozen_payload:
+                return self.app.response_class(progress.frozen_payload, mimetype='application/json')
+            return self._json(self._progress_payload(progress))
+        
+        @self.app.route('/api/progress_stream')
+        def progress_stream():
+            """Push pipeline progress as Server-Sent Events until the pipeline finishes"""
+            scenario_id = request.args.get('scenario_id') or self.current_scenario_id
+            
+            def events():
+                version = None
+                while True:
+                    # Sleep until a step changes; the timeout doubles as a keep-alive that
+                    # also refreshes the running step's duration
+                    with self._progress_changed:
+                        self._progress_changed.wait_for(lambda: self._progress_version != version, timeout=5)
+                        version = self._progress_version
+                    progress = self.pipeline_progress.get(scenario_id)
+                    if progress and progress.frozen_payload:
+                        yield b"data: " + progress.frozen_payload + b"\n\n"
+                        return
+                    payload = self._progress_payload(progress)
+                    yield b"data: " + orjson.dumps(payload) + b"\n\n"
+                    if payload['status'] != 'success' or payload['completed']:
+                        return
+            
+            return Response(events(), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
         
         @self.app.route('/api/next_scenario', methods=['POST'])
         def next_scenario():
             """Move to next scenario in interactive mode"""
             if self.demo_state != "running":
-                return jsonify({'status': 'error', 'message': 'Demo not running'})
+                return self._json({'status': 'error', 'message': 'Demo not running'})
             
             self.current_scenario_index += 1
             self.current_scenario_id = None
@@ -287,9 +324,9 @@ class HumanLoopManager:
             
             if self.current_scenario_index >= len(self.demo_scenarios):
                 self.demo_state = "completed"
-                return jsonify({'status': 'completed', 'message': 'All scenarios completed'})
+                return self._json({'status': 'completed', 'message': 'All scenarios completed'})
             
-            return jsonify({
+            return self._json({
                 'status': 'success',
                 'scenario_number': self.current_scenario_index + 1,
                 'total_scenarios': len(self.demo_scenarios)
@@ -299,34 +336,28 @@ class HumanLoopManager:
         def process_custom_input():
             """Process custom customer input"""
             if not self.demo_instance:
-                return jsonify({'status': 'error', 'message': 'Demo not initialized'})
+                return self._json({'status': 'error', 'message': 'Demo not initialized'})
             
-            data = request.json
+            data = self._request_data()
             custom_input = data.get('input', '').strip()
             
             if not custom_input:
-                return jsonify({'status': 'error', 'message': 'No input provided'})
+                return self._json({'status': 'error', 'message': 'No input provided'})
             
             scenario_id = f"custom_{int(time.time())}"
             self.current_scenario_id = scenario_id
             
             # Initialize pipeline progress
-            with self.progress_lock:
-                self.pipeline_progress[scenario_id] = PipelineProgress(
-                    scenario_id=scenario_id,
-                    customer_input=custom_input,
-                    steps=[],
-                    start_time=time.time()
-                )
+            self._start_progress(scenario_id, custom_input)
             
-            self._start_custom_processing(custom_input, scenario_id)
+            self._submit(self._process_custom_async(custom_input, scenario_id))
             
-            return jsonify({'status': 'processing', 'scenario_id': scenario_id})
+            return self._json({'status': 'processing', 'scenario_id': scenario_id})
         
         @self.app.route('/api/get_demo_status')
         def get_demo_status():
             """Get current demo status"""
-            return jsonify({
+            return self._json({
                 'state': self.demo_state,
                 'current_scenario': self.current_scenario_index + 1 if self.demo_scenarios else 0,
                 'total_scenarios': len(self.demo_scenarios),
@@ -346,80 +377,189 @@ class HumanLoopManager:
             self.current_scenario_id = None
             
             # Clear pipeline progress tracking
-            with self.progress_lock:
-                self.pipeline_progress = {}
+            self.pipeline_progress = OrderedDict()
+            self._notify_progress()
             
             # Clear review system state
             with self.review_lock:
                 self.active_reviews = {}
                 # Clear any pending reviews in queues
-                while not self.review_queue.empty():
-                    try:
-                        self.review_queue.get_nowait()
-                    except queue.Empty:
-                        break
-                while not self.result_queue.empty():
-                    try:
-                        self.result_queue.get_nowait()
-                    except queue.Empty:
-                        break
+                self.review_queue.clear()
+                # The result queue belongs to an event loop thread; drop it rather than drain it
+                # from here. A pending request_review falls back to its timeout.
+                self.result_queue = None
+                self._result_loop = None
             
             logger.info("Demo reset - all state cleared")
-            return jsonify({'status': 'success'})
+            return self._json({'status': 'success'})
         
         @self.app.route('/api/health')
         def health():
             """Health check endpoint"""
-            return jsonify({
+            return self._json({
                 'status': 'healthy',
                 'demo_state': self.demo_state,
                 'active_reviews': len(self.active_reviews),
                 'pipeline_progress_count': len(self.pipeline_progress)
             })
     
+    def _json(self, payload, status: int = 200):
+        """Serialize payload with orjson instead of flask.jsonify"""
+        return self.app.response_class(orjson.dumps(payload), status=status, mimetype='application/json')
+    
+    def _request_data(self) -> Dict[str, Any]:
+        """Parse the JSON request body with orjson, bypassing Flask's json parsing and caching"""
+        raw = request.get_data(cache=False)
+        if not raw:
+            return {}
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            return {}
+    
+    def reload_template(self):
+        """(Re)read template.html into memory; call after editing the template during development"""
+        template_path = os.path.join(os.path.dirname(__file__), 'template.html')
+        try:
+            with open(template_path, 'rb') as f:
+                self._template_bytes, self._template_status = f.read(), 200
+        except FileNotFoundError:
+            self._template_bytes, self._template_status = b"Template file not found", 404
+        except Exception as e:
+            logger.error(f"Error reading template: {e}")
+            self._template_bytes, self._template_status = b"Error loading template", 500
+    
+    def _progress_payload(self, progress: Optional[PipelineProgress]) -> Dict[str, Any]:
+        """Build the progress response for one scenario"""
+        if not progress:
+            return {'status': 'no_progress'}
+        
+        # The pipeline task may append steps concurrently; iterate a snapshot
+        # (tuple() of a list is atomic under the GIL) and tolerate slightly stale data
+        end_ns = progress.end_ns
+        # One clock read per payload; running steps and the total are measured against it
+        now_ns = time.monotonic_ns()
+        steps_data = [{
+            'step_name': step.step_name,
+            'status': step.status,
+            'details': step.details,
+            'duration_ms': ((step.end_ns or now_ns) - step.start_ns) / 1_000_000,
+            'model_used': step.model_used
+        } for step in tuple(progress.steps)]
+        
+        total_duration = 0
+        if progress.start_ns:
+            total_duration = ((end_ns or now_ns) - progress.start_ns) / 1_000_000
+        
+        return {
+            'status': 'success',
+            'scenario_id': progress.scenario_id,
+            'customer_input': progress.customer_input,
+            'current_step': progress.current_step,
+            'total_steps': progress.total_steps,
+            'steps': steps_data,
+            'total_duration_ms': total_duration,
+            'completed': end_ns is not None
+        }
+    
+    def _start_progress(self, scenario_id: str, customer_input: str):
+        """Begin tracking a scenario, evicting the oldest tracked pipeline when full"""
+        progress = self.pipeline_progress
+        while len(progress) >= self.MAX_TRACKED_PIPELINES:
+            progress.popitem(last=False)
+        progress[scenario_id] = PipelineProgress(
+            scenario_id=scenario_id,
+            customer_input=customer_input,
+            steps=[],
+            start_ns=time.monotonic_ns()
+        )
+        progress.move_to_end(scenario_id)
+    
+    def _notify_progress(self):
+        """Wake progress stream subscribers after a state change"""
+        with self._progress_changed:
+            self._progress_version += 1
+            self._progress_changed.notify_all()
+    
     def track_pipeline_step(self, scenario_id: str, step_name: str, details: str = "", model_used: str = None):
         """Track a new pipeline step"""
-        with self.progress_lock:
-            if scenario_id in self.pipeline_progress:
-                self.pipeline_progress[scenario_id].add_step(step_name, details, model_used)
+        # Each scenario has exactly one writer, so step updates go straight to that
+        # scenario's progress object without locking
+        progress = self.pipeline_progress.get(scenario_id)
+        if progress:
+            progress.add_step(step_name, details, model_used)
+            self._notify_progress()
     
     def complete_pipeline_step(self, scenario_id: str, details: str = "", status: str = "completed"):
         """Complete the current pipeline step"""
-        with self.progress_lock:
-            if scenario_id in self.pipeline_progress:
-                self.pipeline_progress[scenario_id].complete_current_step(details, status)
+        progress = self.pipeline_progress.get(scenario_id)
+        if progress:
+            progress.complete_current_step(details, status)
+            self._notify_progress()
+    
+    def record_step(self, scenario_id: str, step_name: str, details: str, duration_ms: float,
+                    status: str = "completed", model_used: str = None):
+        """Record a step that has already finished as a single update"""
+        progress = self.pipeline_progress.get(scenario_id)
+        if progress:
+            progress.record_step(step_name, details, duration_ms, status, model_used)
+            self._notify_progress()
+    
+    def fail_pipeline(self, scenario_id: str, details: str):
+        """Mark the in-flight step (or a trailing error step) failed and end the pipeline"""
+        progress = self.pipeline_progress.get(scenario_id)
+        if progress:
+            if progress.steps and progress.steps[-1].end_ns is None:
+                progress.complete_current_step(details, "failed")
+            else:
+                # Steps recorded via record_step are already closed; don't overwrite them
+                progress.record_step("pipeline_error", details, 0.0, "failed")
+            self._finish_progress(progress)
     
     def complete_pipeline(self, scenario_id: str):
         """Mark pipeline as completed"""
-        with self.progress_lock:
-            if scenario_id in self.pipeline_progress:
-                self.pipeline_progress[scenario_id].end_time = time.time()
+        progress = self.pipeline_progress.get(scenario_id)
+        if progress:
+            self._finish_progress(progress)
     
-    def _start_scenario_processing(self, scenario: str, scenario_id: int, scenario_id_str: str):
-        """Start scenario processing in a background thread"""
-        def run_async():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(self._process_scenario_async(scenario, scenario_id, scenario_id_str))
-            finally:
-                loop.close()
-        
-        thread = Thread(target=run_async, daemon=True)
-        thread.start()
+    def _finish_progress(self, progress: PipelineProgress):
+        """Stamp the end time and freeze the now-immutable progress response"""
+        progress.end_ns = time.monotonic_ns()
+        progress.frozen_payload = orjson.dumps(self._progress_payload(progress))
+        self._notify_progress()
     
-    def _start_custom_processing(self, custom_input: str, scenario_id: str):
-        """Start custom processing in a background thread"""
-        def run_async():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(self._process_custom_async(custom_input, scenario_id))
-            finally:
-                loop.close()
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Return the pipeline loop, starting the shared background loop on first use if needed"""
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._loop_thread = Thread(target=loop.run_forever, name="pipeline-loop", daemon=True)
+                    self._loop_thread.start()
+                    self._loop = loop
+        return self._loop
+    
+    def _submit(self, coro):
+        """Schedule a pipeline coroutine on the pipeline loop from a request thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+    
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the background pipeline loop, if this manager started one"""
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            if thread is None:
+                return
+            self._loop = self._loop_thread = None
         
-        thread = Thread(target=run_async, daemon=True)
-        thread.start()
+        try:
+            # Pooled Groq connections belong to this loop, so release them with it
+            asyncio.run_coroutine_threadsafe(BaseAgent.aclose(), loop).result(timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            if not thread.is_alive():
+                loop.close()
+        logger.info("Pipeline background loop stopped")
     
     async def _process_scenario_async(self, scenario: str, scenario_id: int, scenario_id_str: str):
         """Process scenario asynchronously with detailed pipeline tracking"""
@@ -428,14 +568,8 @@ class HumanLoopManager:
             self.track_pipeline_step(scenario_id_str, "pipeline_start", f"Starting pipeline for scenario {scenario_id}")
             self.complete_pipeline_step(scenario_id_str, f"Pipeline initialized for: {scenario[:50]}...")
             
-            # Process through demo instance with tracking
-            if hasattr(self.demo_instance, 'process_single_scenario_with_tracking'):
-                result = await self.demo_instance.process_single_scenario_with_tracking(
-                    scenario, scenario_id_str, self
-                )
-            else:
-                # Fallback to regular processing
-                result = await self.demo_instance.process_single_scenario(scenario)
+            # Process through demo instance (tracking entry point resolved in set_demo_instance)
+            result = await self._processor(scenario, scenario_id_str, self)
             
             self.demo_results.append(result)
             self.current_scenario_result = result  # Set current scenario result
@@ -444,7 +578,7 @@ class HumanLoopManager:
             
         except Exception as e:
             logger.error(f"Scenario {scenario_id} processing failed: {e}")
-            self.complete_pipeline_step(scenario_id_str, f"Pipeline failed: {str(e)}", "failed")
+            self.fail_pipeline(scenario_id_str, f"Pipeline failed: {str(e)}")
             self.demo_state = "error"
     
     async def _process_custom_async(self, custom_input: str, scenario_id: str):
@@ -454,14 +588,8 @@ class HumanLoopManager:
             self.track_pipeline_step(scenario_id, "pipeline_start", "Starting pipeline for custom input")
             self.complete_pipeline_step(scenario_id, f"Processing: {custom_input[:50]}...")
             
-            # Process through demo instance with tracking
-            if hasattr(self.demo_instance, 'process_single_scenario_with_tracking'):
-                result = await self.demo_instance.process_single_scenario_with_tracking(
-                    custom_input, scenario_id, self
-                )
-            else:
-                # Fallback to regular processing
-                result = await self.demo_instance.process_single_scenario(custom_input)
+            # Process through demo instance (tracking entry point resolved in set_demo_instance)
+            result = await self._processor(custom_input, scenario_id, self)
             
             self.demo_results.append(result)
             self.current_scenario_result = result  # Set current scenario result
@@ -470,12 +598,24 @@ class HumanLoopManager:
             
         except Exception as e:
             logger.error(f"Custom input processing failed: {e}")
-            self.complete_pipeline_step(scenario_id, f"Pipeline failed: {str(e)}", "failed")
+            self.fail_pipeline(scenario_id, f"Pipeline failed: {str(e)}")
     
     def set_demo_instance(self, demo_instance, scenarios):
         """Set the demo instance and scenarios"""
         self.demo_instance = demo_instance
-        self.demo_scenarios = scenarios
+        self.demo_scenarios = tuple(scenarios)  # Read-only for the life of the demo
+        total = len(scenarios)
+        self._scenario_etags = tuple(
+            '"%s"' % hashlib.blake2b(f"{i}:{total}:{scenario}".encode(), digest_size=8).hexdigest()
+            for i, scenario in enumerate(scenarios)
+        )
+        
+        # Resolve the processing entry point once: prefer the tracking variant, else adapt the plain one
+        self._processor = getattr(demo_instance, 'process_single_scenario_with_tracking', None)
+        if self._processor is None:
+            async def process_untracked(customer_input, scenario_id, tracker):
+                return await demo_instance.process_single_scenario(customer_input)
+            self._processor = process_untracked
         logger.info(f"Demo instance set with {len(scenarios)} scenarios")
     
     def start_server(self, port: int = 5001, debug: bool = False):
@@ -484,6 +624,15 @@ class HumanLoopManager:
             logger.warning("Server already running")
             return
         
+        # When started from a coroutine, scenarios are scheduled onto that (otherwise idle) loop;
+        # otherwise a single background loop is started on first use
+        try:
+            app_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            app_loop = None
+        if app_loop is not None and self._loop_thread is None:
+            self._loop = app_loop
+        
         def run_server():
             try:
                 self.app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
@@ -506,40 +655,42 @@ class HumanLoopManager:
         """Request human review with timeout"""
         logger.info("Requesting human review")
         
+        loop = asyncio.get_running_loop()
+        if self._result_loop is not loop:
+            self.result_queue = asyncio.Queue()
+            self._result_loop = loop
+        result_queue = self.result_queue
+        
         # Add to review queue
         review_data = {
             'customer_input': customer_input,
             'ai_response': ai_response,
             'timestamp': time.time()
         }
-        self.review_queue.put(review_data)
+        self.review_queue.append(review_data)
         
         # Wait for result with timeout
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                result = self.result_queue.get(timeout=1.0)
-                logger.info(f"Human review completed in {result.human_time_ms:.1f}ms")
-                return result
-            except queue.Empty:
-                continue
-        
-        # Timeout - return original response
-        logger.warning(f"Human review timed out after {timeout}s")
-        return HumanReviewResult(
-            original_response=ai_response,
-            edited_response=ai_response,
-            human_time_ms=timeout * 1000,
-            customer_input=customer_input,
-            review_notes="Timed out - using original response"
-        )
+        try:
+            result = await asyncio.wait_for(result_queue.get(), timeout=timeout)
+            logger.info(f"Human review completed in {result.human_time_ms:.1f}ms")
+            return result
+        except asyncio.TimeoutError:
+            # Timeout - return original response
+            logger.warning(f"Human review timed out after {timeout}s")
+            return HumanReviewResult(
+                original_response=ai_response,
+                edited_response=ai_response,
+                human_time_ms=timeout * 1000,
+                customer_input=customer_input,
+                review_notes="Timed out - using original response"
+            )
     
     def get_stats(self) -> Dict[str, Any]:
         """Get human loop statistics"""
         return {
             'total_reviews_completed': len(self.demo_results),
             'active_reviews': len(self.active_reviews),
-            'pending_reviews': self.review_queue.qsize(),
+            'pending_reviews': len(self.review_queue),
             'demo_state': self.demo_state,
             'current_scenario': self.current_scenario_index + 1,
             'total_scenarios': len(self.demo_scenarios),
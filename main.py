@@ -1,13 +1,15 @@
 # main.py - Groq Customer Service Pipeline Demo
 import asyncio
+import signal
 import sys
 
+from base import BaseAgent
 from pipeline_demo import GroqCustomerServiceDemo
 from config import config, validate_environment, logger
 from utils import print_banner, validate_groq_connection
 
 # Test scenarios including challenging customers
-DEMO_TEST_SCENARIOS = [
+DEMO_TEST_SCENARIOS = (
     "My order was supposed to arrive yesterday but I haven't received anything. Can you check the status?",
     
     "This is the third time I'm contacting you about my damaged dining table. When will this be resolved?",
@@ -17,7 +19,31 @@ DEMO_TEST_SCENARIOS = [
     "What the heck is wrong with your company?! This whole experience has been a complete disaster and I'm sick of being redirected by your useless customer service!",
     
     "I don't care about your policies. I want a full refund immediately and I expect you to pay for my time wasted dealing with this garbage. Make it happen or I'll blast you on social media."
-]
+)
+
+# Startup status, written in one go once the web interface is up ({port} filled from config)
+READY_MESSAGE = """
+🌐 Customer Service Pipeline Demo: http://localhost:{port}
+📋 Demo Features:
+   ✅ Real-time pipeline monitoring
+   ✅ Human-in-the-loop review process
+   ✅ Safety and tone validation
+   ✅ Automatic response improvement
+   ✅ Performance metrics tracking
+   ✅ Interactive web-based demo modes
+
+🚀 Available Demo Modes (via web interface):
+   1. Interactive Demo - Step through scenarios manually with buttons
+
+Open your browser to http://localhost:{port} to start!
+
+⏳ Server is running. Press Ctrl+C to exit...
+"""
+
+FAILURE_HELP = """Make sure you have all required packages installed:
+   pip install -r requirements.txt
+And that your GROQ_API_KEY is properly configured.
+"""
 
 async def main():
     """Groq customer service pipeline demo"""
@@ -64,26 +90,23 @@ async def main():
         demo.start_web_interface()
         demo.human_loop.set_demo_instance(demo, DEMO_TEST_SCENARIOS)
         
-        print(f"\n🌐 Customer Service Pipeline Demo: http://localhost:{config.web_ui_port}")
-        print("📋 Demo Features:")
-        print("   ✅ Real-time pipeline monitoring")
-        print("   ✅ Human-in-the-loop review process")
-        print("   ✅ Safety and tone validation")
-        print("   ✅ Automatic response improvement")
-        print("   ✅ Performance metrics tracking")
-        print("   ✅ Interactive web-based demo modes")
-        
-        print(f"\n🚀 Available Demo Modes (via web interface):")
-        print("   1. Interactive Demo - Step through scenarios manually with buttons")
-        print(f"\nOpen your browser to http://localhost:{config.web_ui_port} to start!")
+        sys.stdout.write(READY_MESSAGE.format(port=config.web_ui_port))
+        sys.stdout.flush()
         
-        # Keep the server running
-        print("\n⏳ Server is running. Press Ctrl+C to exit...")
+        # Keep the server running without periodic wakeups; Ctrl+C sets the event where
+        # signal handlers are supported, otherwise it surfaces as KeyboardInterrupt
+        stop = asyncio.Event()
         try:
-            while True:
-                await asyncio.sleep(1)
+            asyncio.get_running_loop().add_signal_handler(signal.SIGINT, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+        try:
+            await stop.wait()
         except KeyboardInterrupt:
-            print("\n👋 Demo interrupted by user")
+            pass
+        finally:
+            await BaseAgent.aclose()
+        print("\n👋 Demo interrupted by user")
                 
     except Exception as e:
         logger.error(f"Demo initialization failed: {e}")
@@ -102,8 +125,5 @@ if __name__ == "__main__":
         print("\n👋 Demo interrupted by user")
     except Exception as e:
         logger.error(f"Demo failed: {e}")
-        print(f"\n❌ Demo failed: {e}")
-        print("Make sure you have all required packages installed:")
-        print("   pip install -r requirements.txt")
-        print("And that your GROQ_API_KEY is properly configured.")
+        sys.stdout.write(f"\n❌ Demo failed: {e}\n{FAILURE_HELP}")
         sys.exit(1)
\ No newline at end of file
@@ -2,15 +2,14 @@
 import time
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional
-from dataclasses import asdict
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
 from guard_agent import GuardAgent
 from tone_agent import ToneAgent
 from response_agent import ResponseAgent
 from rewrite_agent import RewriteAgent
 from human_loop import HumanLoopManager
-from utils import PipelineResult, LatencyTracker
+from utils import ModerationResult, PipelineResult, ResultBatch, LatencyTracker, export_results_to_json
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -34,6 +33,8 @@ class GroqCustomerServiceDemo:
         # Performance tracking
         self.pipeline_tracker = LatencyTracker()
         self.results_history: List[PipelineResult] = []
+        # Columnar copy of every result (times, success flags, issue counts) so stats avoid walking result objects
+        self._result_batch = ResultBatch()
         
         logger.info(f"Initialized GroqCustomerServiceDemo for {self.company_name} {self.domain}")
     
@@ -59,7 +60,8 @@ class GroqCustomerServiceDemo:
         try:
             # Phase 1: Initial Safety Check
             logger.debug("Phase 1: Initial safety check")
-            safety_result, guard1_time = await self.guard_agent.check_safety(customer_input)
+            safety_result, guard1_time = await self.guard_agent.check_safety(customer_input, allow_prefilter=True)
+            ai_time = guard1_time  # Groq time, accumulated as each phase finishes
             
             if not safety_result.passes:
                 logger.warning(f"Initial safety check failed: {safety_result.issues}")
@@ -73,6 +75,7 @@ class GroqCustomerServiceDemo:
             ai_response, response_time = await self.response_agent.generate_response(
                 customer_input, context
             )
+            ai_time += response_time
             
             # Phase 3: Human Review (if enabled)
             human_time = 0
@@ -99,9 +102,16 @@ class GroqCustomerServiceDemo:
                     human_time = config.human_review_timeout * 1000
                     # Keep original AI response
             
-            # Phase 4: Final Safety Check
-            logger.debug("Phase 4: Final safety check")
-            final_safety, guard2_time = await self.guard_agent.check_safety(final_response)
+            # Phase 4 + 5: Final Safety Check and Tone Validation
+            # Both only read final_response, so the two Groq calls are overlapped
+            logger.debug("Phase 4/5: Final safety check and tone validation")
+            (final_safety, guard2_time), (tone_result, tone_time) = await asyncio.gather(
+                self.guard_agent.check_safety(final_response),
+                self.tone_agent.validate_tone(final_response)
+            )
+            # ai_time stays total model time (both calls counted); overlapping only shortens wall clock
+            ai_time += guard2_time + tone_time
+            logger.debug(f"Overlapped final checks saved {min(guard2_time, tone_time):.1f}ms of wall-clock time")
             
             if not final_safety.passes:
                 logger.warning(f"Final safety check failed: {final_safety.issues}")
@@ -111,16 +121,12 @@ class GroqCustomerServiceDemo:
                     safety_issues=final_safety.issues
                 )
             
-            # Phase 5: Tone Validation
-            logger.debug("Phase 5: Tone validation")
-            tone_result, tone_time = await self.tone_agent.validate_tone(final_response)
-            
             # Phase 6: Conditional Rewrite
             rewrite_time = 0
-            original_tone_issues = []  # Track original issues that triggered rewrite
+            original_tone_issues = ()  # Track original issues that triggered rewrite
             
             if not tone_result.passes:
-                original_tone_issues = tone_result.issues.copy()  # Preserve original issues
+                original_tone_issues = tone_result.issues  # Immutable tuple, safe to keep without copying
                 logger.debug("Phase 6: Content rewrite (tone issues detected)")
                 final_response, rewrite_time = await self.rewrite_agent.rewrite_professional(
                     final_response, tone_result.issues
@@ -129,13 +135,13 @@ class GroqCustomerServiceDemo:
                 # Final tone check after rewrite
                 final_tone_result, final_tone_time = await self.tone_agent.validate_tone(final_response)
                 rewrite_time += final_tone_time
+                ai_time += rewrite_time
                 
                 if not final_tone_result.passes:
                     logger.warning(f"Tone issues persist after rewrite: {final_tone_result.issues}")
             
             # Calculate metrics
             total_time = (time.perf_counter() - pipeline_start) * 1000
-            ai_time = guard1_time + response_time + guard2_time + tone_time + rewrite_time
             
             # Create result
             result = PipelineResult(
@@ -151,12 +157,12 @@ class GroqCustomerServiceDemo:
             )
             
             # Store result
-            self.results_history.append(result)
+            self._record_result(result)
             self.pipeline_tracker.add_measurement(total_time)
             
             logger.info(f"Scenario {scenario_id} completed successfully in {total_time:.1f}ms")
             
-            return asdict(result)
+            return result.to_dict()
             
         except Exception as e:
             logger.error(f"Scenario {scenario_id} processing failed: {e}")
@@ -177,26 +183,24 @@ class GroqCustomerServiceDemo:
         
         try:
             # Phase 1: Initial Safety Check
-            tracker.track_pipeline_step(scenario_id, "safety_check", "Checking customer input for safety violations", config.guard_model)
-            
-            safety_result, guard1_time = await self.guard_agent.check_safety(customer_input)
+            safety_result, guard1_time = await self.guard_agent.check_safety(customer_input, allow_prefilter=True)
+            ai_time = guard1_time  # Groq time, accumulated as each phase finishes
             
             if not safety_result.passes:
-                tracker.complete_pipeline_step(scenario_id, f"Safety check FAILED: {', '.join(safety_result.issues)}", "failed")
+                tracker.record_step(scenario_id, "safety_check", f"Safety check FAILED: {', '.join(safety_result.issues)}", guard1_time, "failed", config.guard_model)
                 logger.warning(f"Initial safety check failed: {safety_result.issues}")
                 return self._create_failed_result(
                     scenario_id, customer_input, "Initial safety check failed", 
                     safety_issues=safety_result.issues
                 )
             
-            tracker.complete_pipeline_step(scenario_id, f"Safety check PASSED in {guard1_time:.1f}ms")
+            tracker.record_step(scenario_id, "safety_check", f"Safety check PASSED in {guard1_time:.1f}ms", guard1_time, model_used=config.guard_model)
             
             # Phase 2: AI Response Generation
-            tracker.track_pipeline_step(scenario_id, "response_generation", "Generating professional customer service response", config.response_model)
-            
             ai_response, response_time = await self.response_agent.generate_response(customer_input, context)
+            ai_time += response_time
             
-            tracker.complete_pipeline_step(scenario_id, f"Response generated ({len(ai_response)} chars) in {response_time:.1f}ms")
+            tracker.record_step(scenario_id, "response_generation", f"Response generated ({len(ai_response)} chars) in {response_time:.1f}ms", response_time, model_used=config.response_model)
             
             # Phase 3: Human Review (if enabled)
             human_time = 0
@@ -231,39 +235,42 @@ class GroqCustomerServiceDemo:
                     tracker.complete_pipeline_step(scenario_id, f"Human review TIMED OUT after {config.human_review_timeout}s - using original response")
             else:
                 # Skip human review
-                tracker.track_pipeline_step(scenario_id, "human_review", "Human review disabled - skipping")
-                tracker.complete_pipeline_step(scenario_id, "Human review skipped (disabled in config)")
+                tracker.record_step(scenario_id, "human_review", "Human review skipped (disabled in config)", 0.0)
             
             # Phase 4: Final Safety Check
-            tracker.track_pipeline_step(scenario_id, "final_safety", "Final safety check on approved response", config.guard_model)
-            
-            final_safety, guard2_time = await self.guard_agent.check_safety(final_response)
+            # Tone validation only reads final_response too, so it runs alongside the safety check
+            (final_safety, guard2_time), (tone_result, tone_time) = await asyncio.gather(
+                self.guard_agent.check_safety(final_response),
+                self.tone_agent.validate_tone(final_response)
+            )
+            # ai_time stays total model time (both calls counted); overlapping only shortens wall clock
+            ai_time += guard2_time + tone_time
+            logger.debug(f"Overlapped final checks saved {min(guard2_time, tone_time):.1f}ms of wall-clock time")
             
             if not final_safety.passes:
                 logger.warning(f"Final safety check failed: {final_safety.issues}")
-                tracker.complete_pipeline_step(scenario_id, f"Final safety check FAILED: {', '.join(final_safety.issues)}")
-                
-                tracker.complete_pipeline_step(scenario_id, "Safety fixes failed - pipeline terminated", "failed")
+                tracker.record_step(
+                    scenario_id, "final_safety",
+                    f"Final safety check FAILED: {', '.join(final_safety.issues)} - pipeline terminated",
+                    guard2_time, "failed", config.guard_model
+                )
                 return self._create_failed_result(
                     scenario_id, customer_input, "Final safety check failed",
                     safety_issues=final_safety.issues
                 )
                 
             else:
-                tracker.complete_pipeline_step(scenario_id, f"Final safety check PASSED in {guard2_time:.1f}ms")
-            
-            # Phase 5: Tone Validation
-            tracker.track_pipeline_step(scenario_id, "tone_validation", "Validating professional tone and language", config.tone_model)
-            
-            tone_result, tone_time = await self.tone_agent.validate_tone(final_response)
+                tracker.record_step(scenario_id, "final_safety", f"Final safety check PASSED in {guard2_time:.1f}ms", guard2_time, model_used=config.guard_model)
             
+            # Phase 5: Tone Validation (already ran concurrently with the final safety check above)
+
             # Phase 6: Conditional Rewrite
             rewrite_time = 0
-            original_tone_issues = []  # Track original issues that triggered rewrite
+            original_tone_issues = ()  # Track original issues that triggered rewrite
             
             if not tone_result.passes:
-                original_tone_issues = tone_result.issues.copy()  # Preserve original issues
-                tracker.complete_pipeline_step(scenario_id, f"Tone validation FAILED: {', '.join(tone_result.issues)}")
+                original_tone_issues = tone_result.issues  # Immutable tuple, safe to keep without copying
+                tracker.record_step(scenario_id, "tone_validation", f"Tone validation FAILED: {', '.join(tone_result.issues)}", tone_time, model_used=config.tone_model)
                 tracker.track_pipeline_step(scenario_id, "content_rewrite", "Rewriting content to improve professional tone", config.rewrite_model)
                 
                 final_response, rewrite_time = await self.rewrite_agent.rewrite_professional(
@@ -273,6 +280,7 @@ class GroqCustomerServiceDemo:
                 # Final tone check after rewrite
                 final_tone_result, final_tone_time = await self.tone_agent.validate_tone(final_response)
                 rewrite_time += final_tone_time
+                ai_time += rewrite_time
                 
                 if not final_tone_result.passes:
                     logger.warning(f"Tone issues persist after rewrite: {final_tone_result.issues}")
@@ -280,11 +288,10 @@ class GroqCustomerServiceDemo:
                 else:
                     tracker.complete_pipeline_step(scenario_id, f"Content successfully rewritten in {rewrite_time:.1f}ms")
             else:
-                tracker.complete_pipeline_step(scenario_id, f"Tone validation PASSED in {tone_time:.1f}ms")
+                tracker.record_step(scenario_id, "tone_validation", f"Tone validation PASSED in {tone_time:.1f}ms", tone_time, model_used=config.tone_model)
             
             # Calculate metrics
             total_time = (time.perf_counter() - pipeline_start) * 1000
-            ai_time = guard1_time + response_time + guard2_time + tone_time + rewrite_time
             
             # Create result
             result = PipelineResult(
@@ -300,7 +307,7 @@ class GroqCustomerServiceDemo:
             )
             
             # Store result
-            self.results_history.append(result)
+            self._record_result(result)
             self.pipeline_tracker.add_measurement(total_time)
             
             # Mark pipeline as complete
@@ -308,15 +315,67 @@ class GroqCustomerServiceDemo:
             
             logger.info(f"Scenario {scenario_id} completed successfully in {total_time:.1f}ms")
             
-            return asdict(result)
+            return result.to_dict()
             
         except Exception as e:
             logger.error(f"Scenario {scenario_id} processing failed: {e}")
             if 'tracker' in locals():
-                tracker.complete_pipeline_step(scenario_id, f"Pipeline FAILED: {str(e)}", "failed")
-                tracker.complete_pipeline(scenario_id)
+                tracker.fail_pipeline(scenario_id, f"Pipeline FAILED: {str(e)}")
             return self._create_failed_result(scenario_id, customer_input, str(e))
     
+    async def run_pipeline_batch(
+        self,
+        customer_inputs: List[str],
+        contexts: List[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Process many scenarios concurrently, returning results in input order"""
+        logger.info(f"Processing batch of {len(customer_inputs)} scenarios")
+        
+        contexts = contexts or [None] * len(customer_inputs)
+        batch_id = int(time.time())
+        
+        # Scenarios are independent; run them together, capped to respect rate limits
+        semaphore = asyncio.Semaphore(config.max_concurrency)
+        
+        async def process_one(scenario_id: str, customer_input: str, context: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.process_single_scenario(customer_input, scenario_id, context)
+        
+        scenario_ids = [f"batch_{batch_id}_{i + 1}" for i in range(len(customer_inputs))]
+        outcomes = await asyncio.gather(
+            *(process_one(*args) for args in zip(scenario_ids, customer_inputs, contexts)),
+            return_exceptions=True
+        )
+        
+        # process_single_scenario already turns pipeline errors into failed results; this
+        # only catches anything that escapes it (e.g. cancellation of a single scenario)
+        return [
+            self._create_failed_result(scenario_id, customer_input, str(outcome))
+            if isinstance(outcome, BaseException) else outcome
+            for scenario_id, customer_input, outcome in zip(scenario_ids, customer_inputs, outcomes)
+        ]
+    
+    async def validate_and_rewrite(self, contents: List[str]) -> AsyncIterator[Tuple[int, str, ModerationResult]]:
+        """Tone-check contents, rewriting failures, and yield (index, final_content, tone_result) as each finishes"""
+        # Each item's rewrite starts as soon as its own tone check fails rather than after the batch
+        semaphore = asyncio.Semaphore(config.max_concurrency)
+        
+        async def process_one(i: int, content: str) -> Tuple[int, str, ModerationResult]:
+            async with semaphore:
+                tone_result, _ = await self.tone_agent.validate_tone(content)
+                if not tone_result.passes:
+                    content, _ = await self.rewrite_agent.rewrite_professional(content, tone_result.issues)
+            return i, content, tone_result
+        
+        tasks = [asyncio.ensure_future(process_one(i, c)) for i, c in enumerate(contents)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumer stopped early: don't leave Groq calls running
+            for task in tasks:
+                task.cancel()
+    
     def _create_failed_result(
         self, 
         scenario_id: str, 
@@ -333,14 +392,19 @@ class GroqCustomerServiceDemo:
             final_response=f"Processing failed: {error_message}",
             ai_time=0,
             total_time=0,
-            safety_issues=safety_issues or [],
-            tone_issues=tone_issues or [],
+            safety_issues=safety_issues,
+            tone_issues=tone_issues,
             success=False
         )
         
-        self.results_history.append(failed_result)
+        self._record_result(failed_result)
         
-        return asdict(failed_result)
+        return failed_result.to_dict()
+    
+    def _record_result(self, result: PipelineResult):
+        """Append a result to the history and the stats columns"""
+        self.results_history.append(result)
+        self._result_batch.append(result)
     
     def get_performance_stats(self) -> Dict[str, Any]:
         """Get comprehensive performance statistics"""
@@ -348,12 +412,12 @@ class GroqCustomerServiceDemo:
         if not self.results_history:
             return {"message": "No data available"}
         
-        successful_results = [r for r in self.results_history if r.success]
+        batch_metrics = self._result_batch.metrics()
         
         stats = {
-            "total_processed": len(self.results_history),
-            "successful": len(successful_results),
-            "success_rate": len(successful_results) / len(self.results_history) * 100,
+            "total_processed": batch_metrics["total_processed"],
+            "successful": batch_metrics["successful"],
+            "success_rate": batch_metrics["success_rate"],
             "pipeline_tracker": self.pipeline_tracker.get_stats(),
             "agent_stats": {
                 "guard": self.guard_agent.get_performance_stats(),
@@ -363,12 +427,11 @@ class GroqCustomerServiceDemo:
             }
         }
         
-        if successful_results:
-            ai_times = [r.ai_time for r in successful_results]
+        if batch_metrics["successful"]:
             stats["ai_performance"] = {
-                "avg_time": sum(ai_times) / len(ai_times),
-                "min_time": min(ai_times),
-                "max_time": max(ai_times)
+                "avg_time": batch_metrics["avg_ai_time"],
+                "min_time": batch_metrics["min_ai_time"],
+                "max_time": batch_metrics["max_ai_time"]
             }
         
         return stats
@@ -381,6 +444,7 @@ class GroqCustomerServiceDemo:
         self.tone_agent.reset_metrics()
         self.rewrite_agent.reset_metrics()
         self.results_history = []
+        self._result_batch = ResultBatch()
         
         logger.info("All metrics reset")
     
@@ -389,13 +453,16 @@ class GroqCustomerServiceDemo:
         
         logger.info("Performing pipeline health check...")
         
-        checks = {
-            "guard_agent": await self.guard_agent.health_check(),
-            "response_agent": await self.response_agent.health_check(),
-            "tone_agent": await self.tone_agent.health_check(),
-            "rewrite_agent": await self.rewrite_agent.health_check(),
-            "web_interface": self.human_loop.is_running() if hasattr(self.human_loop, 'is_running') else True
-        }
+        # The agent probes are independent network calls, so run them concurrently
+        agent_names = ("guard_agent", "response_agent", "tone_agent", "rewrite_agent")
+        agent_results = await asyncio.gather(
+            self.guard_agent.health_check(),
+            self.response_agent.health_check(),
+            self.tone_agent.health_check(),
+            self.rewrite_agent.health_check()
+        )
+        checks = dict(zip(agent_names, agent_results))
+        checks["web_interface"] = getattr(self.human_loop, 'is_running', True)
         
         all_healthy = all(checks.values())
         
@@ -408,7 +475,7 @@ class GroqCustomerServiceDemo:
         
         if format == "dict":
             return {
-                "results": [asdict(r) for r in self.results_history],
+                "results": [r.to_dict() for r in self.results_history],
                 "stats": self.get_performance_stats(),
                 "config": {
                     "company_name": self.company_name,
@@ -417,6 +484,9 @@ class GroqCustomerServiceDemo:
             }
         elif format == "summary":
             return self.get_performance_stats()
+        elif format == "json":
+            # Encoded straight from the dataclasses, without building the per-result dicts
+            return export_results_to_json(self.results_history)
         else:
             raise ValueError(f"Unsupported export format: {format}")
     
@@ -1,95 +1,200 @@
 # response_agent.py - Groq response generation
+import re
 import time
+import asyncio
 import logging
-from typing import Tuple
+import functools
+from collections import OrderedDict
+from typing import FrozenSet, Optional, Pattern, Tuple
+import orjson
 from base import BaseAgent
 from config import config, get_response_prompt
 
 logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r"\w+")
+
+# Label some completions echo in front of the reply
+_PREFIX_RE = re.compile(r"^(?:Response|Customer service response):\s*", re.IGNORECASE)
+
+# Reply used when generation fails; formatted once per company name, not on every failure
+_FALLBACK_TEMPLATE = """Thank you for contacting {company}. I understand you need assistance, and I want to help resolve your concern.
+
+I'm currently experiencing a technical issue that prevents me from providing a detailed response right now. However, I want to ensure you receive the support you need.
+
+Please reach out to our support team directly, and they will be able to assist you immediately with your inquiry.
+
+I apologize for any inconvenience, and thank you for your patience."""
+
+@functools.lru_cache(maxsize=4)
+def _load_faq(path: str) -> Tuple[Tuple[Pattern[str], str], ...]:
+    """Compile (pattern, reply template) pairs from a JSON FAQ file; bad entries are logged and skipped"""
+    if not path:
+        return ()
+    try:
+        with open(path, "rb") as f:
+            entries = orjson.loads(f.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"FAQ file {path} not loaded: {e}")
+        return ()
+    if not isinstance(entries, list):
+        logger.warning(f"FAQ file {path} not loaded: expected a JSON list of entries")
+        return ()
+    
+    faq = []
+    for i, entry in enumerate(entries):
+        try:
+            faq.append((re.compile(entry["pattern"], re.IGNORECASE), str(entry["response"])))
+        except (KeyError, TypeError, re.error) as e:
+            logger.warning(f"FAQ entry {i} in {path} skipped: {e}")
+    return tuple(faq)
+
+def _word_shingles(text: str) -> FrozenSet[Tuple[str, ...]]:
+    """Case-insensitive set of adjacent word pairs, used to spot near-duplicate customer inputs
+    
+    Pairs rather than single words keep word order in the comparison, so inputs that only
+    rearrange the same words ("did receive ... not the item" / "did not receive ... the item")
+    don't match each other. Single-word inputs fall back to the word itself.
+    """
+    words = _WORD_RE.findall(text.casefold())
+    if len(words) < 2:
+        return frozenset((word,) for word in words)
+    return frozenset(zip(words, words[1:]))
+
 class ResponseAgent(BaseAgent):
     """Professional customer service response generation using Groq"""
     
+    # Recent context-free responses kept for near-duplicate reuse
+    MAX_SIMILAR_RESPONSES = 256
+    
+    # Context keys rendered into the prompt, in order, with their labels
+    _CTX_FIELDS = (
+        ("customer_id", "Customer ID"),
+        ("order_id", "Order ID"),
+        ("previous_interactions", "Previous interactions"),
+        ("urgency", "Urgency level"),
+    )
+    
     def __init__(self, company_name: str = None, domain: str = None):
         super().__init__()
         self.model = config.response_model
         self.response_prompt = get_response_prompt(company_name, domain)
         self.company_name = company_name or config.company_name
         self.domain = domain or config.company_domain
+        self._fallback_response = _FALLBACK_TEMPLATE.format(company=self.company_name)
+        self._faq_replies = self._format_faq_replies()
+        self._similar_responses: "OrderedDict[FrozenSet[Tuple[str, ...]], str]" = OrderedDict()
         
         logger.info(f"Initialized ResponseAgent for {self.company_name} {self.domain}")
     
     async def generate_response(self, customer_input: str, context: dict = None) -> Tuple[str, float]:
         """Generate professional customer service response"""
-        start = time.perf_counter()
+        start_ns = time.perf_counter_ns()
+        
+        # Canned FAQ answers (opt-in) skip Groq entirely; like the reuse below they only apply to
+        # context-free requests so personalised replies are always generated
+        if context is None:
+            for pattern, reply in self._faq_replies:
+                if pattern.search(customer_input):
+                    latency = (time.perf_counter_ns() - start_ns) / 1_000_000
+                    logger.debug("Response served from FAQ")
+                    return reply, latency
+        
+        # Near-duplicate reuse (opt-in; lexical, not semantic). Only context-free responses are
+        # shared, so nothing customer-specific can leak into another customer's reply.
+        shingles = None
+        if context is None and config.response_similarity_threshold > 0:
+            shingles = _word_shingles(customer_input)
+            similar = self._find_similar_response(shingles)
+            if similar is not None:
+                latency = (time.perf_counter_ns() - start_ns) / 1_000_000
+                logger.debug("Response reused from a near-duplicate input")
+                return similar, latency
         
         try:
             logger.debug(f"Generating response for: {customer_input[:50]}...")
             
-            # Prepare messages with optional context
-            messages = [
-                {"role": "system", "content": self.response_prompt}
-            ]
-            
-            # Add context if provided
+            # The system prompt stays byte-identical across requests so providers can reuse the
+            # cached prefix; everything request-specific (context included) goes in the user turn
+            user_content = f"Customer message: {customer_input}"
             if context:
-                context_str = self._format_context(context)
-                messages.append({"role": "system", "content": f"Additional context: {context_str}"})
-            
-            messages.append({"role": "user", "content": f"Customer message: {customer_input}"})
+                user_content = f"Additional context: {self._format_context(context)}\n\n{user_content}"
             
             response = await self._make_groq_request(
                 model=self.model,
-                messages=messages,
+                messages=[
+                    {"role": "system", "content": self.response_prompt},
+                    {"role": "user", "content": user_content}
+                ],
                 max_tokens=config.max_tokens_response,
                 temperature=0.1  # Low temperature for consistent, professional responses
             )
             
-            latency = self._track_latency(start)
+            latency = self._track_latency_ns(start_ns)
             
             # Clean and validate response
             cleaned_response = self._clean_response(response)
+            if shingles and cleaned_response != self._fallback_response:
+                self._remember_response(shingles, cleaned_response)
             
             logger.info(f"Response generated successfully in {latency:.1f}ms ({len(cleaned_response)} chars)")
             
             return cleaned_response, latency
             
         except Exception as e:
-            latency = self._track_latency(start)
+            latency = self._track_latency_ns(start_ns)
             logger.error(f"Response generation failed: {e}")
             
             # Return fallback response
             fallback = self._get_fallback_response(customer_input)
             return fallback, latency
     
-    def _format_context(self, context: dict) -> str:
-        """Format additional context for the AI"""
-        context_parts = []
-        
-        if context.get('customer_id'):
-            context_parts.append(f"Customer ID: {context['customer_id']}")
-        
-        if context.get('order_id'):
-            context_parts.append(f"Order ID: {context['order_id']}")
+    def _format_faq_replies(self) -> Tuple[Tuple[Pattern[str], str], ...]:
+        """FAQ patterns paired with replies filled in for this agent's company and domain"""
+        return tuple(
+            # Plain replace, not str.format: replies may contain other literal braces
+            (pattern, reply.replace("{company}", self.company_name).replace("{domain}", self.domain))
+            for pattern, reply in _load_faq(config.faq_path)
+        )
+    
+    def _find_similar_response(self, shingles: FrozenSet[Tuple[str, ...]]) -> Optional[str]:
+        """Return the stored response whose input best matches shingles above the configured threshold"""
+        if not shingles:
+            return None
         
-        if context.get('previous_interactions'):
-            context_parts.append(f"Previous interactions: {context['previous_interactions']}")
+        exact = self._similar_responses.get(shingles)
+        if exact is not None:
+            self._similar_responses.move_to_end(shingles)
+            return exact
         
-        if context.get('urgency'):
-            context_parts.append(f"Urgency level: {context['urgency']}")
+        best_key, best_score = None, config.response_similarity_threshold
+        for key in self._similar_responses:
+            score = len(shingles & key) / len(shingles | key)
+            if score >= best_score:
+                best_key, best_score = key, score
         
-        return " | ".join(context_parts)
+        if best_key is None:
+            return None
+        self._similar_responses.move_to_end(best_key)
+        return self._similar_responses[best_key]
+    
+    def _remember_response(self, shingles: FrozenSet[Tuple[str, ...]], response: str) -> None:
+        """Store a context-free response, evicting the least recently used entry when full"""
+        if not shingles:
+            return
+        self._similar_responses[shingles] = response
+        self._similar_responses.move_to_end(shingles)
+        if len(self._similar_responses) > self.MAX_SIMILAR_RESPONSES:
+            self._similar_responses.popitem(last=False)
+    
+    def _format_context(self, context: dict) -> str:
+        """Format additional context for the AI"""
+        return " | ".join(f"{label}: {context[key]}" for key, label in self._CTX_FIELDS if context.get(key))
     
     def _clean_response(self, response: str) -> str:
         """Clean and validate the generated response"""
-        cleaned = response.strip()
-        
         # Remove any system artifacts
-        if cleaned.startswith("Response:"):
-            cleaned = cleaned[9:].strip()
-        
-        if cleaned.startswith("Customer service response:"):
-            cleaned = cleaned[26:].strip()
+        cleaned = _PREFIX_RE.sub("", response.strip(), count=1)
         
         # Ensure response isn't too short
         if len(cleaned) < 20:
@@ -100,13 +205,7 @@ class ResponseAgent(BaseAgent):
     
     def _get_fallback_response(self, customer_input: str) -> str:
         """Generate fallback response when AI fails"""
-        return f"""Thank you for contacting {self.company_name}. I understand you need assistance, and I want to help resolve your concern.
-
-I'm currently experiencing a technical issue that prevents me from providing a detailed response right now. However, I want to ensure you receive the support you need.
-
-Please reach out to our support team directly, and they will be able to assist you immediately with your inquiry.
-
-I apologize for any inconvenience, and thank you for your patience."""
+        return self._fallback_response
     
     async def generate_multiple_responses(
         self, 
@@ -116,15 +215,19 @@ I apologize for any inconvenience, and thank you for your patience."""
         """Generate responses for multiple customer inputs"""
         logger.info(f"Generating {len(customer_inputs)} responses")
         
-        results = []
         contexts = contexts or [None] * len(customer_inputs)
         
-        for i, (customer_input, context) in enumerate(zip(customer_inputs, contexts)):
-            logger.debug(f"Processing input {i+1}/{len(customer_inputs)}")
-            result = await self.generate_response(customer_input, context)
-            results.append(result)
+        # Generations are independent requests; run them concurrently, capped to respect rate limits
+        semaphore = asyncio.Semaphore(config.max_concurrency)
+        
+        async def generate_one(i: int, customer_input: str, context: dict) -> Tuple[str, float]:
+            async with semaphore:
+                logger.debug(f"Processing input {i+1}/{len(customer_inputs)}")
+                return await self.generate_response(customer_input, context)
         
-        return results
+        return list(await asyncio.gather(
+            *(generate_one(i, c, ctx) for i, (c, ctx) in enumerate(zip(customer_inputs, contexts)))
+        ))
     
     def update_prompt(self, company_name: str = None, domain: str = None):
         """Update the response generation prompt"""
@@ -134,6 +237,8 @@ I apologize for any inconvenience, and thank you for your patience."""
             self.domain = domain
         
         self.response_prompt = get_response_prompt(self.company_name, self.domain)
+        self._fallback_response = _FALLBACK_TEMPLATE.format(company=self.company_name)
+        self._faq_replies = self._format_faq_replies()
         logger.info(f"Updated prompt for {self.company_name} {self.domain}")
     
     def get_response_stats(self, responses: list[str]) -> dict:
@@ -141,13 +246,25 @@ I apologize for any inconvenience, and thank you for your patience."""
         if not responses:
             return {}
         
-        lengths = [len(r) for r in responses]
-        word_counts = [len(r.split()) for r in responses]
+        # Single pass over the responses
+        total = length_sum = word_sum = 0
+        min_length = max_length = len(responses[0])
+        for r in responses:
+            n = len(r)
+            total += 1
+            length_sum += n
+            word_sum += len(r.split())
+            if n < min_length:
+                min_length = n
+            elif n > max_length:
+                max_length = n
         
         return {
-            "total_responses": len(responses),
-            "avg_length": sum(lengths) / len(lengths),
-            "avg_word_count": sum(word_counts) / len(word_counts),
-            "min_length": min(lengths),
-            "max_length": max(lengths)
+            "total_responses": total,
+            "avg_length": length_sum / total,
+            "avg_word_count": word_sum / total,
+            "min_length": min_length,
+            "max_length": max_length,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
         }
\ No newline at end of file
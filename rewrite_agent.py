@@ -1,12 +1,30 @@
 # rewrite_agent.py - Groq content rewriting
 import time
+import asyncio
 import logging
 from typing import List, Tuple
 from base import BaseAgent
 from config import config, get_rewrite_prompt
+from utils import (
+    ISSUE_CASUAL, ISSUE_DISMISSIVE, ISSUE_UNPROFESSIONAL, ISSUE_JARGON, ISSUE_BLAME,
+    ISSUE_ABSOLUTE, ISSUE_INAPPROPRIATE, ISSUE_URGENCY, ISSUE_EMOTION
+)
 
 logger = logging.getLogger(__name__)
 
+# Rewrite guidance for each tone issue code
+_ISSUE_DESCRIPTIONS = {
+    ISSUE_CASUAL: "Replace casual expressions with professional language",
+    ISSUE_UNPROFESSIONAL: "Use more empathetic and professional tone",
+    ISSUE_URGENCY: "Replace urgent slang with professional alternatives",
+    ISSUE_INAPPROPRIATE: "Remove colloquial or inappropriate expressions",
+    ISSUE_DISMISSIVE: "Make language more helpful and solution-focused",
+    ISSUE_BLAME: "Remove blame and focus on solutions",
+    ISSUE_JARGON: "Simplify technical terms for customer understanding",
+    ISSUE_ABSOLUTE: "Soften absolute statements and provide alternatives",
+    ISSUE_EMOTION: "Maintain professional emotional tone"
+}
+
 class RewriteAgent(BaseAgent):
     """Professional content rewriting using Groq"""
     
@@ -21,28 +39,29 @@ class RewriteAgent(BaseAgent):
     
     async def rewrite_professional(self, content: str, issues: List[str] = None) -> Tuple[str, float]:
         """Rewrite content to match professional standards"""
-        start = time.perf_counter()
+        start_ns = time.perf_counter_ns()
         
         try:
             logger.debug(f"Rewriting content: {content[:50]}... (issues: {issues})")
             
-            # Prepare enhanced prompt with specific issues
-            enhanced_prompt = self.rewrite_prompt
-            if issues:
-                issue_context = self._format_issue_context(issues)
-                enhanced_prompt += issue_context
+            # The rewrite prompt stays byte-identical across requests so providers can reuse the
+            # cached prefix; issue-specific guidance goes in the user turn ahead of the content
+            user_content = content
+            issue_context = self._format_issue_context(issues)
+            if issue_context:
+                user_content = f"{issue_context.lstrip()}\n\nMESSAGE TO REWRITE:\n{content}"
             
             response = await self._make_groq_request(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": enhanced_prompt},
-                    {"role": "user", "content": content}
+                    {"role": "system", "content": self.rewrite_prompt},
+                    {"role": "user", "content": user_content}
                 ],
                 max_tokens=config.max_tokens_rewrite,
                 temperature=0.2  # Slightly higher for creative rewriting
             )
             
-            latency = self._track_latency(start)
+            latency = self._track_latency_ns(start_ns)
             
             # Clean and validate rewritten content
             rewritten = self._clean_rewrite(response, content)
@@ -53,7 +72,7 @@ class RewriteAgent(BaseAgent):
             return rewritten, latency
             
         except Exception as e:
-            latency = self._track_latency(start)
+            latency = self._track_latency_ns(start_ns)
             logger.error(f"Content rewriting failed: {e}")
             
             # Return original content on error - let the AI model handle improvements
@@ -64,22 +83,7 @@ class RewriteAgent(BaseAgent):
         if not issues:
             return ""
         
-        issue_descriptions = {
-            "casual_language": "Replace casual expressions with professional language",
-            "unprofessional_tone": "Use more empathetic and professional tone", 
-            "inappropriate_urgency": "Replace urgent slang with professional alternatives",
-            "inappropriate_language": "Remove colloquial or inappropriate expressions",
-            "dismissive_language": "Make language more helpful and solution-focused",
-            "blame_language": "Remove blame and focus on solutions",
-            "technical_jargon": "Simplify technical terms for customer understanding",
-            "absolute_statements": "Soften absolute statements and provide alternatives",
-            "inappropriate_emotions": "Maintain professional emotional tone"
-        }
-        
-        formatted_issues = []
-        for issue in issues:
-            if issue in issue_descriptions:
-                formatted_issues.append(issue_descriptions[issue])
+        formatted_issues = [_ISSUE_DESCRIPTIONS[issue] for issue in issues if issue in _ISSUE_DESCRIPTIONS]
         
         if formatted_issues:
             context = f"\n\nSPECIFIC IMPROVEMENTS NEEDED:\n" + "\n".join(f"- {issue}" for issue in formatted_issues)
@@ -97,7 +101,7 @@ class RewriteAgent(BaseAgent):
             return original
         
         # Check if rewrite is identical to original (no improvement attempted)
-        if cleaned.strip() == original.strip():
+        if cleaned == original.strip():
             logger.info("Rewrite identical to original - AI determined no changes needed")
             return original
         
@@ -111,15 +115,19 @@ class RewriteAgent(BaseAgent):
         """Rewrite multiple contents"""
         logger.info(f"Rewriting {len(contents)} contents")
         
-        results = []
         issues_list = issues_list or [None] * len(contents)
         
-        for i, (content, issues) in enumerate(zip(contents, issues_list)):
-            logger.debug(f"Rewriting content {i+1}/{len(contents)}")
-            result = await self.rewrite_professional(content, issues)
-            results.append(result)
+        # Rewrites are independent requests; run them concurrently, capped to respect rate limits
+        semaphore = asyncio.Semaphore(config.max_concurrency)
         
-        return results
+        async def rewrite_one(i: int, content: str, issues: List[str]) -> Tuple[str, float]:
+            async with semaphore:
+                logger.debug(f"Rewriting content {i+1}/{len(contents)}")
+                return await self.rewrite_professional(content, issues)
+        
+        return list(await asyncio.gather(
+            *(rewrite_one(i, c, issues) for i, (c, issues) in enumerate(zip(contents, issues_list)))
+        ))
     
     def analyze_rewrite_quality(self, originals: List[str], rewrites: List[str]) -> dict:
         """Analyze the quality of rewrites"""
@@ -134,19 +142,19 @@ class RewriteAgent(BaseAgent):
             "changes_made": 0
         }
         
-        length_changes = []
+        # Length change and change count accumulate in the same pass; no intermediate list
+        length_change_sum = 0
         changes_made = 0
         
         for orig, rewrite in zip(originals, rewrites):
             # Calculate length change
-            length_change = len(rewrite) - len(orig)
-            length_changes.append(length_change)
+            length_change_sum += len(rewrite) - len(orig)
             
             # Count actual changes made
             if orig.strip() != rewrite.strip():
                 changes_made += 1
         
-        analysis["avg_length_change"] = sum(length_changes) / len(length_changes)
+        analysis["avg_length_change"] = length_change_sum / len(rewrites)
         analysis["changes_made"] = changes_made
         analysis["change_rate"] = changes_made / len(rewrites)
         
@@ -157,16 +165,26 @@ class RewriteAgent(BaseAgent):
         if not rewrites:
             return {}
         
-        lengths = [len(r) for r in rewrites]
-        word_counts = [len(r.split()) for r in rewrites]
+        # Single pass over the rewrites
+        total = length_sum = word_sum = 0
+        min_length = max_length = len(rewrites[0])
+        for r in rewrites:
+            n = len(r)
+            total += 1
+            length_sum += n
+            word_sum += len(r.split())
+            if n < min_length:
+                min_length = n
+            elif n > max_length:
+                max_length = n
         
         return {
-            "total_rewrites": len(rewrites),
-            "avg_length": sum(lengths) / len(lengths),
-            "avg_word_count": sum(word_counts) / len(word_counts),
+            "total_rewrites": total,
+            "avg_length": length_sum / total,
+            "avg_word_count": word_sum / total,
             "avg_latency_ms": sum(latencies) / len(latencies),
-            "min_length": min(lengths),
-            "max_length": max(lengths)
+            "min_length": min_length,
+            "max_length": max_length
         }
     
     def update_prompt(self, company_name: str = None, domain: str = None):
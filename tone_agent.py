@@ -1,28 +1,72 @@
 # tone_agent.py - Groq tone validation
+import re
 import time
+import asyncio
 import logging
-from typing import List, Tuple
+import functools
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 from base import BaseAgent
 from config import config, get_tone_validation_prompt
-from utils import ModerationResult
+from utils import (
+    ModerationResult, ISSUE_CASUAL, ISSUE_DISMISSIVE, ISSUE_UNPROFESSIONAL, ISSUE_JARGON, ISSUE_BLAME,
+    ISSUE_ABSOLUTE, ISSUE_INAPPROPRIATE, ISSUE_URGENCY, ISSUE_EMOTION, ISSUE_TONE_VIOLATION
+)
 
 logger = logging.getLogger(__name__)
 
-class ToneAgent(BaseAgent):
-    """Professional tone validation for customer service responses using Groq"""
-    
-    def __init__(self, company_name: str = None, domain: str = None):
-        super().__init__()
-        self.model = config.tone_model
-        self.company_name = company_name or config.company_name
-        self.domain = domain or config.company_domain
-        self.tone_prompt = get_tone_validation_prompt(company_name, domain)
-        
-        logger.info(f"Initialized ToneAgent for {self.company_name} {self.domain}")
-        
-        # Enhanced customer service tone standards
-        self.tone_standards = f"""
-You are validating customer service responses for {self.company_name}'s professional tone compliance.
+# Keywords in a FAIL verdict mapped to issue codes; order sets the order issues are reported in
+_TONE_ISSUE_CODES = {
+    "CASUAL": ISSUE_CASUAL,
+    "DISMISSIVE": ISSUE_DISMISSIVE,
+    "UNPROFESSIONAL": ISSUE_UNPROFESSIONAL,
+    "JARGON": ISSUE_JARGON,
+    "BLAME": ISSUE_BLAME,
+    "ABSOLUTE": ISSUE_ABSOLUTE,
+    "INAPPROPRIATE": ISSUE_INAPPROPRIATE,
+    "URGENCY": ISSUE_URGENCY,
+    "EMOTION": ISSUE_EMOTION
+}
+# Matched case-insensitively so the raw response is scanned without an upper() copy
+_TONE_ISSUE_RE = re.compile("|".join(_TONE_ISSUE_CODES), re.IGNORECASE)
+_FAIL_RE = re.compile("FAIL", re.IGNORECASE)
+
+# A streamed verdict is complete once it reads "PASS", or "FAIL: ..." up to the end of its first line
+_VERDICT_COMPLETE_RE = re.compile(r"\s*(?:PASS|FAIL[^\n]*\n)", re.IGNORECASE)
+
+# Worker threads for summarising large result batches off the event loop
+_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tone-summary")
+
+# Batched validation: one numbered verdict per line, e.g. "2: FAIL: casual_language"
+_BATCH_INSTRUCTIONS = """
+BATCH FORMAT:
+You will receive several numbered responses ([1], [2], ...). Evaluate each one independently and
+reply with exactly one line per response, in order: "<number>: PASS" or "<number>: FAIL: [specific_issue]".
+"""
+_BATCH_LINE_RE = re.compile(r"^\s*\[?(\d+)\]?\s*[:.)]\s*(.+)$", re.MULTILINE)
+
+def _verdict_complete(text: str) -> bool:
+    """True once a partial tone response already holds the whole verdict"""
+    return _VERDICT_COMPLETE_RE.match(text) is not None
+
+_IMPROVEMENT_SUGGESTIONS = {
+    ISSUE_CASUAL: "Replace casual expressions with professional alternatives",
+    ISSUE_DISMISSIVE: "Use more empathetic and solution-focused language",
+    ISSUE_UNPROFESSIONAL: "Adopt a more professional and respectful tone",
+    ISSUE_JARGON: "Explain technical terms in customer-friendly language",
+    ISSUE_BLAME: "Focus on solutions rather than blame",
+    ISSUE_ABSOLUTE: "Provide alternative solutions or workarounds",
+    ISSUE_INAPPROPRIATE: "Use appropriate business communication language",
+    ISSUE_URGENCY: "Use professional urgency language",
+    ISSUE_EMOTION: "Maintain professional emotional tone"
+}
+
+# Enhanced customer service tone standards, built once per company and shared by every agent
+@functools.lru_cache(maxsize=8)
+def _build_tone_standards(company: str) -> str:
+    return f"""
+You are validating customer service responses for {company}'s professional tone compliance.
 
 CRITICAL REQUIREMENTS - Response must be:
 ✓ Empathetic and understanding
@@ -56,19 +100,47 @@ Examples:
 "That's totally screwed up, sorry!" → FAIL: unprofessional_tone, casual_language
 "We sincerely apologize and will resolve this promptly." → PASS
 """
+
+class ToneAgent(BaseAgent):
+    """Professional tone validation for customer service responses using Groq"""
+    
+    def __init__(self, company_name: str = None, domain: str = None):
+        super().__init__()
+        self.model = config.tone_model
+        self.company_name = company_name or config.company_name
+        self.domain = domain or config.company_domain
+        self.tone_prompt = get_tone_validation_prompt(company_name, domain)
+        
+        logger.info(f"Initialized ToneAgent for {self.company_name} {self.domain}")
+        
+        self.tone_standards = _build_tone_standards(self.company_name)
     
     async def validate_tone(self, content: str) -> Tuple[ModerationResult, float]:
         """Validate customer service tone and professionalism"""
-        start = time.perf_counter()
+        start_ns = time.perf_counter_ns()
+        
+        cache_key = self._content_key(content)
+        cached = self._get_cached_verdict(cache_key)
+        if cached is not None:
+            passes, issues = cached
+            latency = (time.perf_counter_ns() - start_ns) / 1_000_000
+            logger.debug(f"Tone validation cache hit ({'PASSED' if passes else 'FAILED'})")
+            return ModerationResult(
+                passes=passes,
+                confidence=0.90,
+                issues=issues,
+                latency_ms=latency
+            ), latency
         
         try:
             logger.debug(f"Validating tone for: {content[:50]}...")
             
             response = await self._groq_tone_validation(content)
-            latency = self._track_latency(start)
+            latency = self._track_latency_ns(start_ns)
             
             # Parse tone validation response
             passes, issues = self._parse_tone_response(response)
+            self._cache_verdict(cache_key, passes, issues)
             
             result = ModerationResult(
                 passes=passes,
@@ -84,14 +156,14 @@ Examples:
             return result, latency
             
         except Exception as e:
-            latency = self._track_latency(start)
+            latency = self._track_latency_ns(start_ns)
             logger.error(f"Tone validation failed: {e}")
             
             # Return pass on error to avoid blocking pipeline
             return ModerationResult(
                 passes=True,
                 confidence=0.0,
-                issues=["tone_validation_error"],
+                issues=("tone_validation_error",),
                 latency_ms=latency
             ), latency
     
@@ -103,83 +175,112 @@ Examples:
                 {"role": "system", "content": self.tone_standards},
                 {"role": "user", "content": f"Validate this customer service response:\n\n{content}"}
             ],
-            max_tokens=config.max_tokens_tone
+            max_tokens=config.max_tokens_tone,
+            # The verdict leads the output; stop generating once it has arrived
+            stream=True,
+            stream_until=_verdict_complete
         )
     
-    def _parse_tone_response(self, response: str) -> Tuple[bool, List[str]]:
-        """Parse tone validation response"""
-        response_clean = response.strip().upper()
-        
-        if "FAIL" in response_clean:
-            issues = []
-            
-            # Map specific tone issues
-            issue_patterns = {
-                "CASUAL": "casual_language",
-                "DISMISSIVE": "dismissive_language", 
-                "UNPROFESSIONAL": "unprofessional_tone",
-                "JARGON": "technical_jargon",
-                "BLAME": "blame_language",
-                "ABSOLUTE": "absolute_statements",
-                "INAPPROPRIATE": "inappropriate_language",
-                "URGENCY": "inappropriate_urgency",
-                "EMOTION": "inappropriate_emotions"
-            }
-            
-            # Extract specific issues from response
-            for pattern, issue_code in issue_patterns.items():
-                if pattern in response_clean:
-                    issues.append(issue_code)
+    async def _groq_tone_validation_batch(self, contents: List[str]) -> str:
+        """Use Scout to validate several numbered responses in one request"""
+        numbered = "\n\n".join(f"[{i}] {content}" for i, content in enumerate(contents, 1))
+        return await self._make_groq_request(
+            model=self.model,
+            messages=[
+                # Standards first so the batch prompt shares the single-item prompt's cached prefix
+                {"role": "system", "content": self.tone_standards + _BATCH_INSTRUCTIONS},
+                {"role": "user", "content": f"Validate these customer service responses:\n\n{numbered}"}
+            ],
+            max_tokens=config.max_tokens_tone * len(contents)
+        )
+    
+    def _parse_tone_response(self, response: str) -> Tuple[bool, Tuple[str, ...]]:
+        """Parse tone validation response (issues come back as an immutable tuple)"""
+        if _FAIL_RE.search(response):
+            # Extract specific issues from response in one regex pass
+            found = {match.upper() for match in _TONE_ISSUE_RE.findall(response)}
+            issues = tuple(code for keyword, code in _TONE_ISSUE_CODES.items() if keyword in found)
             
             # Fallback generic issue
-            if not issues:
-                issues = ["tone_violation"]
-                
-            return False, issues
+            return False, issues or (ISSUE_TONE_VIOLATION,)
         
-        return True, []
+        return True, ()
     
     def get_improvement_suggestions(self, issues: List[str]) -> List[str]:
         """Get specific improvement suggestions based on identified issues"""
-        suggestions = {
-            "casual_language": "Replace casual expressions with professional alternatives",
-            "dismissive_language": "Use more empathetic and solution-focused language",
-            "unprofessional_tone": "Adopt a more professional and respectful tone",
-            "technical_jargon": "Explain technical terms in customer-friendly language",
-            "blame_language": "Focus on solutions rather than blame",
-            "absolute_statements": "Provide alternative solutions or workarounds",
-            "inappropriate_language": "Use appropriate business communication language",
-            "inappropriate_urgency": "Use professional urgency language",
-            "inappropriate_emotions": "Maintain professional emotional tone"
-        }
-        
-        return [suggestions.get(issue, "Improve overall professionalism") for issue in issues]
+        return [_IMPROVEMENT_SUGGESTIONS.get(issue, "Improve overall professionalism") for issue in issues]
     
     async def validate_multiple_responses(self, contents: List[str]) -> List[Tuple[ModerationResult, float]]:
         """Validate tone for multiple responses"""
         logger.info(f"Validating tone for {len(contents)} responses")
         
-        results = []
-        for i, content in enumerate(contents):
-            logger.debug(f"Validating response {i+1}/{len(contents)}")
-            result = await self.validate_tone(content)
-            results.append(result)
+        # Validations are independent requests; run them concurrently, capped to respect rate limits
+        semaphore = asyncio.Semaphore(config.max_concurrency)
+        
+        async def validate_one(i: int, content: str) -> Tuple[ModerationResult, float]:
+            async with semaphore:
+                logger.debug(f"Validating response {i+1}/{len(contents)}")
+                return await self.validate_tone(content)
         
+        return list(await asyncio.gather(*(validate_one(i, c) for i, c in enumerate(contents))))
+    
+    async def validate_batch(self, contents: List[str], batch_size: int = 10) -> List[Tuple[ModerationResult, float]]:
+        """Validate tone for multiple responses, packing up to batch_size of them into each Groq request"""
+        logger.info(f"Batch validating tone for {len(contents)} responses ({batch_size} per request)")
+        
+        results: List[Optional[Tuple[ModerationResult, float]]] = [None] * len(contents)
+        uncached = [i for i, c in enumerate(contents) if self._get_cached_verdict(self._content_key(c)) is None]
+        semaphore = asyncio.Semaphore(config.max_concurrency)
+        
+        async def validate_chunk(indices: List[int]) -> None:
+            async with semaphore:
+                start_ns = time.perf_counter_ns()
+                try:
+                    response = await self._groq_tone_validation_batch([contents[i] for i in indices])
+                    verdicts = {int(n): line for n, line in _BATCH_LINE_RE.findall(response)}
+                except Exception as e:
+                    logger.warning(f"Batch tone validation failed, validating items individually: {e}")
+                    verdicts = {}
+                latency = self._track_latency_ns(start_ns)
+            
+            missing = []
+            for n, i in enumerate(indices, 1):
+                line = verdicts.get(n)
+                if line is None:
+                    missing.append(i)
+                    continue
+                passes, issues = self._parse_tone_response(line)
+                self._cache_verdict(self._content_key(contents[i]), passes, issues)
+                results[i] = ModerationResult(passes=passes, confidence=0.90, issues=issues, latency_ms=latency), latency
+            
+            # Items the model skipped or mangled fall back to the single-item path
+            for i in missing:
+                results[i] = await self.validate_tone(contents[i])
+        
+        async def validate_cached(i: int) -> None:
+            results[i] = await self.validate_tone(contents[i])
+        
+        uncached_set = set(uncached)
+        await asyncio.gather(
+            *(validate_chunk(uncached[k:k + batch_size]) for k in range(0, len(uncached), batch_size)),
+            *(validate_cached(i) for i in range(len(contents)) if i not in uncached_set)
+        )
         return results
     
     def get_tone_summary(self, results: List[ModerationResult]) -> dict:
         """Get summary statistics for tone validation"""
-        total = len(results)
-        passed = sum(1 for r in results if r.passes)
+        # Single pass over the results
+        total = passed = 0
+        latency_sum = 0.0
+        issue_counts = Counter()
+        for r in results:
+            total += 1
+            passed += r.passes
+            latency_sum += r.latency_ms
+            issue_counts.update(r.issues)
         failed = total - passed
         
-        avg_latency = sum(r.latency_ms for r in results) / total if total > 0 else 0
-        
-        # Count issue types
-        issue_counts = {}
-        for result in results:
-            for issue in result.issues:
-                issue_counts[issue] = issue_counts.get(issue, 0) + 1
+        avg_latency = latency_sum / total if total > 0 else 0
         
         return {
             "total_validations": total,
@@ -187,9 +288,15 @@ Examples:
             "failed": failed,
             "pass_rate": passed / total if total > 0 else 0,
             "avg_latency_ms": avg_latency,
-            "common_issues": dict(sorted(issue_counts.items(), key=lambda x: x[1], reverse=True)[:5])
+            "common_issues": dict(issue_counts.most_common(5)),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
         }
     
+    async def get_tone_summary_async(self, results: List[ModerationResult]) -> dict:
+        """get_tone_summary on a worker thread, so summarising large batches doesn't stall in-flight Groq calls"""
+        return await asyncio.get_running_loop().run_in_executor(_SUMMARY_EXECUTOR, self.get_tone_summary, results)
+    
     def update_standards(self, company_name: str = None, domain: str = None):
         """Update tone validation standards"""
         if company_name:
@@ -198,6 +305,8 @@ Examples:
             self.domain = domain
         
         self.tone_prompt = get_tone_validation_prompt(self.company_name, self.domain)
+        self.tone_standards = _build_tone_standards(self.company_name)
+        self._verdict_cache.clear()
         logger.info(f"Updated tone standards for {self.company_name} {self.domain}")
     
     def analyze_tone_patterns(self, contents: List[str], results: List[ModerationResult]) -> dict:
@@ -206,20 +315,26 @@ Examples:
             logger.error("Mismatched contents and results for pattern analysis")
             return {}
         
+        # Bucket by length and count failures in a single pass: [short, medium, long]
+        length_sum = 0
+        bucket_totals = [0, 0, 0]
+        bucket_failures = [0, 0, 0]
+        for c, r in zip(contents, results):
+            n = len(c)
+            length_sum += n
+            bucket = 0 if n < 100 else 1 if n < 300 else 2
+            bucket_totals[bucket] += 1
+            bucket_failures[bucket] += not r.passes
+        
         patterns = {
-            "avg_response_length": sum(len(c) for c in contents) / len(contents),
+            "avg_response_length": length_sum / len(contents),
             "failure_rate_by_length": {},
             "common_fail_phrases": []
         }
         
         # Analyze failure rate by response length
-        short_responses = [(c, r) for c, r in zip(contents, results) if len(c) < 100]
-        medium_responses = [(c, r) for c, r in zip(contents, results) if 100 <= len(c) < 300]
-        long_responses = [(c, r) for c, r in zip(contents, results) if len(c) >= 300]
-        
-        for category, responses in [("short", short_responses), ("medium", medium_responses), ("long", long_responses)]:
-            if responses:
-                failed = sum(1 for _, r in responses if not r.passes)
-                patterns["failure_rate_by_length"][category] = failed / len(responses)
+        for bucket, category in enumerate(("short", "medium", "long")):
+            if bucket_totals[bucket]:
+                patterns["failure_rate_by_length"][category] = bucket_failures[bucket] / bucket_totals[bucket]
         
         return patterns
\ No newline at end of file
@@ -1,188 +1,380 @@
 # utils.py - Utilities for Groq pipeline
 import time
-import statistics
+import bisect
+import hashlib
 import logging
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
-from groq import Groq
+import threading
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import compress
+from math import fsum
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Iterator, List, Dict, Any, Mapping, Optional, Sequence, Tuple
+import orjson
 from config import config
+from groq_client import get_groq_client
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Tone issue codes shared by the tone, rewrite and reporting code
+ISSUE_CASUAL = "casual_language"
+ISSUE_DISMISSIVE = "dismissive_language"
+ISSUE_UNPROFESSIONAL = "unprofessional_tone"
+ISSUE_JARGON = "technical_jargon"
+ISSUE_BLAME = "blame_language"
+ISSUE_ABSOLUTE = "absolute_statements"
+ISSUE_INAPPROPRIATE = "inappropriate_language"
+ISSUE_URGENCY = "inappropriate_urgency"
+ISSUE_EMOTION = "inappropriate_emotions"
+ISSUE_TONE_VIOLATION = "tone_violation"
+
+# Issue codes that count as safety or tone violations in ModerationResult checks
+_SAFETY_VIOLATIONS = frozenset({
+    "violence_hate", "sexual_content", "weapons",
+    "substances", "self_harm", "criminal_planning"
+})
+_TONE_VIOLATIONS = frozenset({
+    ISSUE_CASUAL, ISSUE_DISMISSIVE, ISSUE_UNPROFESSIONAL,
+    ISSUE_JARGON, ISSUE_BLAME, ISSUE_ABSOLUTE
+})
+
+@dataclass(frozen=True, slots=True)
 class ModerationResult:
-    """Enhanced moderation result with detailed issue tracking"""
+    """Enhanced moderation result with detailed issue tracking (immutable, one per check)"""
     passes: bool
     confidence: float
-    issues: List[str]
+    issues: Tuple[str, ...]
     latency_ms: float
     
     def has_safety_violations(self) -> bool:
         """Check if result contains safety violations"""
-        safety_violations = [
-            "violence_hate", "sexual_content", "weapons", 
-            "substances", "self_harm", "criminal_planning"
-        ]
-        return any(issue in safety_violations for issue in self.issues)
+        return not _SAFETY_VIOLATIONS.isdisjoint(self.issues)
     
     def has_tone_violations(self) -> bool:
         """Check if result contains tone violations"""
-        tone_violations = [
-            "casual_language", "dismissive_language", "unprofessional_tone",
-            "technical_jargon", "blame_language", "absolute_statements"
-        ]
-        return any(issue in tone_violations for issue in self.issues)
+        return not _TONE_VIOLATIONS.isdisjoint(self.issues)
 
-@dataclass
+@dataclass(slots=True)
 class PipelineResult:
-    """Complete pipeline execution result"""
+    """Complete pipeline execution result (slotted: results accumulate for the whole session)"""
     scenario_id: str
     customer_input: str
     final_response: str
     ai_time: float
     total_time: float
     human_time: Optional[float] = None
-    safety_issues: List[str] = None
-    tone_issues: List[str] = None
+    safety_issues: List[str] = field(default_factory=list)
+    tone_issues: List[str] = field(default_factory=list)
     success: bool = True
+    
+    def __post_init__(self):
+        # Callers that pass None explicitly still get lists, so readers never need `or []`
+        if self.safety_issues is None:
+            self.safety_issues = []
+        if self.tone_issues is None:
+            self.tone_issues = []
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Build a flat dict without dataclasses.asdict's recursive deep copy"""
+        return {
+            "scenario_id": self.scenario_id,
+            "customer_input": self.customer_input,
+            "final_response": self.final_response,
+            "ai_time": self.ai_time,
+            "total_time": self.total_time,
+            "human_time": self.human_time,
+            "safety_issues": self.safety_issues,
+            "tone_issues": self.tone_issues,
+            "success": self.success
+        }
+
+class ResultBatch:
+    """Column-per-field store of the PipelineResult numbers that metrics read"""
+    
+    # Appended to as results complete, so polling metrics walks a few contiguous arrays
+    # instead of reading attributes off every PipelineResult. The dataclasses stay the public
+    # record; this is only the stats store.
+    def __init__(self):
+        self.ids: List[str] = []
+        self.ai_time = array("d")
+        self.total_time = array("d")
+        self.success = array("b")
+        self.safety_counts = array("i")
+        self.tone_counts = array("i")
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def append(self, result: PipelineResult) -> None:
+        """Add one result's scalars to the columns"""
+        self.ids.append(result.scenario_id)
+        self.ai_time.append(result.ai_time)
+        self.total_time.append(result.total_time)
+        self.success.append(result.success)
+        self.safety_counts.append(len(result.safety_issues))
+        self.tone_counts.append(len(result.tone_issues))
+    
+    def extend(self, results: Sequence[PipelineResult]) -> None:
+        """Add several results' scalars to the columns"""
+        for result in results:
+            self.append(result)
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Success rate, issue totals and success-only timing (see calculate_pipeline_metrics)"""
+        total = len(self.ids)
+        if not total:
+            return {}
+        
+        # One sort of the successful ai times serves min, max and every reported percentile
+        ai_times = sorted(compress(self.ai_time, self.success))
+        successful = len(ai_times)
+        metrics = {
+            "total_processed": total,
+            "successful": successful,
+            "success_rate": successful / total * 100,
+            "avg_ai_time": 0,
+            "avg_total_time": 0,
+            "safety_issues_detected": sum(self.safety_counts),
+            "tone_issues_resolved": sum(self.tone_counts),
+            "latency_distribution": {}
+        }
+        
+        if successful:
+            metrics["avg_ai_time"] = fsum(ai_times) / successful
+            metrics["avg_total_time"] = fsum(compress(self.total_time, self.success)) / successful
+            metrics["min_ai_time"] = ai_times[0]
+            metrics["max_ai_time"] = ai_times[-1]
+            metrics["latency_distribution"] = {
+                f"p{p}": _sorted_percentile(ai_times, p) for p in LATENCY_PERCENTILES
+            }
+        
+        return metrics
 
 class LatencyTracker:
-    """Track and analyze latency metrics"""
+    """Track and analyze latency metrics over the most recent MAX_SAMPLES measurements"""
+    
+    # Fixed-size ring keeps memory bounded for long-running servers. A sorted copy of the same
+    # window is maintained on insert, so min/max/percentiles never need a fresh sort. Samples
+    # are integer nanoseconds (8 bytes each in the sorted array) and become ms only in get_stats.
+    MAX_SAMPLES = 4096
+    
+    # Percentiles reported by get_stats, all read from the one sorted window
+    PERCENTILES = (50, 90, 95, 99)
+    
+    # Returned (as a copy, since callers add their own keys) while no samples are recorded
+    _EMPTY_STATS = MappingProxyType(dict.fromkeys(("avg", "min", "max", "count", *(f"p{p}" for p in PERCENTILES)), 0))
     
     def __init__(self):
-        self.measurements: List[float] = []
-        self.start_time: Optional[float] = None
+        self.measurements: deque = deque(maxlen=self.MAX_SAMPLES)
+        self._sorted = array("q")
+        self._lock = threading.Lock()
+        self.start_time: Optional[int] = None
+    
+    @contextmanager
+    def timer(self) -> Iterator[None]:
+        """Time the enclosed block; the start stays local, so overlapping timings are safe"""
+        start_ns = time.monotonic_ns()
+        try:
+            yield
+        finally:
+            self.add_measurement_ns(time.monotonic_ns() - start_ns)
     
     def start_timer(self) -> None:
-        """Start timing operation"""
-        self.start_time = time.perf_counter()
+        """Start timing operation (one at a time per tracker; use timer() for concurrent code)"""
+        self.start_time = time.monotonic_ns()
     
     def stop_timer(self) -> float:
         """Stop timer and return elapsed time in ms"""
         if self.start_time is None:
             return 0.0
         
-        elapsed = (time.perf_counter() - self.start_time) * 1000
-        self.add_measurement(elapsed)
+        elapsed_ns = time.monotonic_ns() - self.start_time
+        self.add_measurement_ns(elapsed_ns)
         self.start_time = None
-        return elapsed
+        return elapsed_ns / 1_000_000
     
     def add_measurement(self, latency_ms: float) -> None:
         """Add latency measurement"""
-        self.measurements.append(latency_ms)
+        self.add_measurement_ns(round(latency_ms * 1_000_000))
+    
+    def add_measurement_ns(self, latency_ns: int) -> None:
+        """Add latency measurement taken with an integer nanosecond clock"""
+        # Agents on different event-loop threads share trackers; the ring and its sorted copy
+        # must change together
+        with self._lock:
+            if len(self.measurements) == self.MAX_SAMPLES:
+                # The append below evicts the oldest sample; drop it from the sorted copy too
+                del self._sorted[bisect.bisect_left(self._sorted, self.measurements[0])]
+            self.measurements.append(latency_ns)
+            bisect.insort(self._sorted, latency_ns)
     
     def get_stats(self) -> Dict[str, float]:
         """Get latency statistics"""
-        if not self.measurements:
-            return {"avg": 0, "min": 0, "max": 0, "p95": 0, "count": 0}
-        
-        return {
-            "avg": statistics.mean(self.measurements),
-            "min": min(self.measurements),
-            "max": max(self.measurements),
-            "p95": self._percentile(self.measurements, 95),
-            "count": len(self.measurements)
-        }
+        with self._lock:
+            if not self._sorted:
+                return dict(self._EMPTY_STATS)
+            
+            stats = {
+                # Integer nanoseconds sum exactly, so plain sum() needs no statistics.mean
+                "avg": sum(self.measurements) / len(self.measurements) / 1_000_000,
+                "min": self._sorted[0] / 1_000_000,
+                "max": self._sorted[-1] / 1_000_000,
+                "count": len(self._sorted)
+            }
+            stats.update((f"p{p}", _sorted_percentile(self._sorted, p) / 1_000_000) for p in self.PERCENTILES)
+            return stats
     
     def reset(self) -> None:
         """Reset all measurements"""
-        self.measurements = []
+        with self._lock:
+            self.measurements.clear()
+            del self._sorted[:]
         self.start_time = None
+
+def _sorted_percentile(sorted_data: Sequence[float], percentile: float) -> float:
+    """Linearly interpolated percentile of already-sorted, non-empty data"""
+    index = (percentile / 100) * (len(sorted_data) - 1)
+    lower = int(index)
+    upper = min(lower + 1, len(sorted_data) - 1)
+    weight = index - lower
+    return sorted_data[lower] + weight * (sorted_data[upper] - sorted_data[lower])
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL for deterministic Groq responses"""
     
-    def _percentile(self, data: List[float], percentile: int) -> float:
-        """Calculate percentile"""
-        if not data:
-            return 0.0
-        sorted_data = sorted(data)
-        index = (percentile / 100) * (len(sorted_data) - 1)
-        lower = int(index)
-        upper = min(lower + 1, len(sorted_data) - 1)
-        weight = index - lower
-        return sorted_data[lower] + weight * (sorted_data[upper] - sorted_data[lower])
+    def __init__(self, maxsize: int = 4096, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+        """Hash the full request payload into a cache key"""
+        payload = orjson.dumps(
+            {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return hashlib.sha256(payload).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def put(self, key: str, value: str) -> None:
+        """Store a response, evicting least recently used entries when full"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Drop all cached responses"""
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Display metadata per moderation issue, built once at import and shared read-only
+_ISSUE_CATEGORIES = MappingProxyType({issue: MappingProxyType(info) for issue, info in {
+    "violence_hate": {
+        "category": "Violence & Hate",
+        "severity": "HIGH",
+        "description": "Content promoting violence or discrimination"
+    },
+    "sexual_content": {
+        "category": "Sexual Content", 
+        "severity": "HIGH",
+        "description": "Inappropriate sexual or explicit content"
+    },
+    "weapons": {
+        "category": "Weapons & Illegal Items",
+        "severity": "HIGH", 
+        "description": "Content about illegal weapons or dangerous items"
+    },
+    "substances": {
+        "category": "Regulated Substances",
+        "severity": "MEDIUM",
+        "description": "Content about illegal drugs or substances"
+    },
+    "self_harm": {
+        "category": "Self-Harm & Suicide",
+        "severity": "CRITICAL",
+        "description": "Content encouraging self-harm or suicide"
+    },
+    "criminal_planning": {
+        "category": "Criminal Activities",
+        "severity": "HIGH",
+        "description": "Content helping plan criminal activities"
+    },
+    ISSUE_CASUAL: {
+        "category": "Tone - Casual Language",
+        "severity": "LOW",
+        "description": "Unprofessional casual expressions"
+    },
+    ISSUE_DISMISSIVE: {
+        "category": "Tone - Dismissive",
+        "severity": "MEDIUM", 
+        "description": "Dismissive or unhelpful language"
+    },
+    ISSUE_UNPROFESSIONAL: {
+        "category": "Tone - Unprofessional",
+        "severity": "MEDIUM",
+        "description": "Generally unprofessional tone"
+    }
+}.items()})
+_DEFAULT_ISSUE_CATEGORY = MappingProxyType({
+    "category": "Unknown Issue",
+    "severity": "LOW",
+    "description": "Unclassified moderation issue"
+})
 
 class SafetyIssueAnalyzer:
     """Analyze and categorize safety issues"""
     
     @staticmethod
-    def categorize_safety_issue(issue: str) -> Dict[str, str]:
+    def categorize_safety_issue(issue: str) -> Mapping[str, str]:
         """Categorize safety issue with description and severity"""
-        categories = {
-            "violence_hate": {
-                "category": "Violence & Hate",
-                "severity": "HIGH",
-                "description": "Content promoting violence or discrimination"
-            },
-            "sexual_content": {
-                "category": "Sexual Content", 
-                "severity": "HIGH",
-                "description": "Inappropriate sexual or explicit content"
-            },
-            "weapons": {
-                "category": "Weapons & Illegal Items",
-                "severity": "HIGH", 
-                "description": "Content about illegal weapons or dangerous items"
-            },
-            "substances": {
-                "category": "Regulated Substances",
-                "severity": "MEDIUM",
-                "description": "Content about illegal drugs or substances"
-            },
-            "self_harm": {
-                "category": "Self-Harm & Suicide",
-                "severity": "CRITICAL",
-                "description": "Content encouraging self-harm or suicide"
-            },
-            "criminal_planning": {
-                "category": "Criminal Activities",
-                "severity": "HIGH",
-                "description": "Content helping plan criminal activities"
-            },
-            "casual_language": {
-                "category": "Tone - Casual Language",
-                "severity": "LOW",
-                "description": "Unprofessional casual expressions"
-            },
-            "dismissive_language": {
-                "category": "Tone - Dismissive",
-                "severity": "MEDIUM", 
-                "description": "Dismissive or unhelpful language"
-            },
-            "unprofessional_tone": {
-                "category": "Tone - Unprofessional",
-                "severity": "MEDIUM",
-                "description": "Generally unprofessional tone"
-            }
-        }
-        
-        return categories.get(issue, {
-            "category": "Unknown Issue",
-            "severity": "LOW",
-            "description": "Unclassified moderation issue"
-        })
+        return _ISSUE_CATEGORIES.get(issue, _DEFAULT_ISSUE_CATEGORY)
+
+# Magnitude tables for the formatters below: bisect_right over the upper bounds picks the
+# (divisor, format) row, so each formatter is one lookup instead of an if/elif chain
+_LATENCY_BOUNDS = (1, 1000)
+_LATENCY_FORMATS = ((1, "{:.2f}ms"), (1, "{:.1f}ms"), (1000, "{:.2f}s"))
+_HUMAN_TIME_BOUNDS = (1000, 60000)
+_HUMAN_TIME_FORMATS = ((1, "{:.0f}ms"), (1000, "{:.1f}s"))
 
 def format_latency_output(latency_ms: float) -> str:
     """Format latency for human-readable output"""
-    if latency_ms < 1:
-        return f"{latency_ms:.2f}ms"
-    elif latency_ms < 1000:
-        return f"{latency_ms:.1f}ms" 
-    else:
-        return f"{latency_ms/1000:.2f}s"
+    divisor, fmt = _LATENCY_FORMATS[bisect.bisect_right(_LATENCY_BOUNDS, latency_ms)]
+    return fmt.format(latency_ms / divisor)
 
 def format_human_time_output(time_ms: float) -> str:
     """Format human review time for output"""
-    if time_ms < 1000:
-        return f"{time_ms:.0f}ms"
-    elif time_ms < 60000:
-        return f"{time_ms/1000:.1f}s"
-    else:
-        minutes = int(time_ms / 60000)
-        seconds = (time_ms % 60000) / 1000
-        return f"{minutes}m {seconds:.1f}s"
+    index = bisect.bisect_right(_HUMAN_TIME_BOUNDS, time_ms)
+    if index < len(_HUMAN_TIME_FORMATS):
+        divisor, fmt = _HUMAN_TIME_FORMATS[index]
+        return fmt.format(time_ms / divisor)
+    minutes = int(time_ms / 60000)
+    seconds = (time_ms % 60000) / 1000
+    return f"{minutes}m {seconds:.1f}s"
 
-def print_banner():
-    """Print application banner"""
-    banner = f"""
+# Application banner; config is fixed after startup, so it is formatted once at import
+BANNER = f"""
 {'='*80}
 🚀 GROQ CUSTOMER SERVICE PIPELINE
 {'='*80}
@@ -194,19 +386,17 @@ Domain: {config.company_domain}
 Voice: {config.brand_voice}
 {'='*80}
 """
-    print(banner)
+
+def print_banner():
+    """Print application banner"""
+    print(BANNER)
 
 async def validate_groq_connection() -> bool:
     """Validate connection to Groq API"""
     try:
-        client = Groq(
-            api_key="",
-            base_url="https://demo-proxy.groqcloud.dev",
-            default_headers={"Origin": f"https://groq-customer-service-template.vercel.groqcloud.net"}
-        )
-        
-        # Test with a simple request
-        response = client.chat.completions.create(
+        # Awaited on the pooled async client, so startup doesn't block the event loop and the
+        # pipeline reuses the connection opened here
+        response = await get_groq_client().chat.completions.create(
             model=config.guard_model,
             messages=[{"role": "user", "content": "test"}],
             max_tokens=10,
@@ -219,45 +409,22 @@ async def validate_groq_connection() -> bool:
         logger.error(f"Groq connection validation failed: {e}")
         return False
 
+# AI-time percentiles reported in pipeline metrics
+LATENCY_PERCENTILES = (50, 95, 99)
+
 def calculate_pipeline_metrics(results: List[PipelineResult]) -> Dict[str, Any]:
     """Calculate comprehensive pipeline metrics"""
     if not results:
         return {}
     
-    successful_results = [r for r in results if r.success]
-    
-    metrics = {
-        "total_processed": len(results),
-        "successful": len(successful_results),
-        "success_rate": len(successful_results) / len(results) * 100,
-        "avg_ai_time": 0,
-        "avg_total_time": 0,
-        "safety_issues_detected": 0,
-        "tone_issues_resolved": 0,
-        "latency_distribution": {}
-    }
-    
-    if successful_results:
-        ai_times = [r.ai_time for r in successful_results]
-        total_times = [r.total_time for r in successful_results]
-        
-        metrics["avg_ai_time"] = statistics.mean(ai_times)
-        metrics["avg_total_time"] = statistics.mean(total_times)
-        metrics["min_ai_time"] = min(ai_times)
-        metrics["max_ai_time"] = max(ai_times)
-    
-    # Count issues
-    for result in results:
-        if result.safety_issues:
-            metrics["safety_issues_detected"] += len(result.safety_issues)
-        if result.tone_issues:
-            metrics["tone_issues_resolved"] += len(result.tone_issues)
-    
-    return metrics
+    batch = ResultBatch()
+    batch.extend(results)
+    return batch.metrics()
 
-def print_pipeline_summary(results: List[PipelineResult]):
-    """Print comprehensive pipeline summary"""
-    metrics = calculate_pipeline_metrics(results)
+def print_pipeline_summary(results: List[PipelineResult], metrics: Dict[str, Any] = None):
+    """Print comprehensive pipeline summary (pass metrics if already calculated for results)"""
+    if metrics is None:
+        metrics = calculate_pipeline_metrics(results)
     
     if not metrics:
         print("No results to summarize")
@@ -288,12 +455,13 @@ def print_pipeline_summary(results: List[PipelineResult]):
     else:
         print("  ❌ Pipeline reliability needs attention")
 
-def validate_pipeline_health(results: List[PipelineResult]) -> Dict[str, bool]:
-    """Validate overall pipeline health"""
+def validate_pipeline_health(results: List[PipelineResult], metrics: Dict[str, Any] = None) -> Dict[str, bool]:
+    """Validate overall pipeline health (pass metrics if already calculated for results)"""
     if not results:
         return {"sufficient_data": False}
     
-    metrics = calculate_pipeline_metrics(results)
+    if metrics is None:
+        metrics = calculate_pipeline_metrics(results)
     
     health_checks = {
         "sufficient_data": len(results) >= 5,
@@ -306,23 +474,21 @@ def validate_pipeline_health(results: List[PipelineResult]) -> Dict[str, bool]:
 
 def export_results_to_dict(results: List[PipelineResult]) -> Dict[str, Any]:
     """Export results to dictionary for JSON serialization"""
+    # Calculated once and shared with the health checks
+    metrics = calculate_pipeline_metrics(results)
     return {
-        "summary": calculate_pipeline_metrics(results),
-        "results": [
-            {
-                "scenario_id": r.scenario_id,
-                "customer_input": r.customer_input,
-                "final_response": r.final_response,
-                "ai_time": r.ai_time,
-                "total_time": r.total_time,
-                "human_time": r.human_time,
-                "safety_issues": r.safety_issues or [],
-                "tone_issues": r.tone_issues or [],
-                "success": r.success
-            }
-            for r in results
-        ],
-        "health_checks": validate_pipeline_health(results),
+        "summary": metrics,
+        "results": [r.to_dict() for r in results],
+        "health_checks": validate_pipeline_health(results, metrics),
         "timestamp": time.time()
     }
-    
\ No newline at end of file
+
+def export_results_to_json(results: List[PipelineResult]) -> bytes:
+    """Export results straight to JSON bytes; orjson encodes the dataclasses without per-result dicts"""
+    metrics = calculate_pipeline_metrics(results)
+    return orjson.dumps({
+        "summary": metrics,
+        "results": results,
+        "health_checks": validate_pipeline_health(results, metrics),
+        "timestamp": time.time()
+    })
\ No newline at end of file